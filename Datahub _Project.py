@@ -6,6 +6,8 @@ import os
 import warnings
 warnings.filterwarnings('ignore')
 
+from survey_data import load_survey
+
 st.write("Hello, how are you?")
 
 st.set_page_config(page_title="Datahub Newbies Survey", page_icon=":bar_chart:", layout="wide")
@@ -13,7 +15,7 @@ st.set_page_config(page_title="Datahub Newbies Survey", page_icon=":bar_chart:",
 st.title (":bar_chart: Data Analyst Dashboard")
 st.markdown('<style>div.block-container{padding-top:1rem;}<\style>', unsafe_allow_html=True)
 
-datahub = "newbies.csv"
+datahub = load_survey("newbies.csv")
 
 col1, col2, col3 = st.columns((0.3, 0.7, 0.7))
 with col1:
@@ -0,0 +1,122 @@
+"""Pre-aggregated respondent counts for the dashboard charts.
+
+The cube holds one row per observed combination of the filterable and
+charted dimensions together with its respondent count. Sidebar selections
+slice the cube and chart data is a marginal of the slice, so chart work
+grows with the number of category combinations rather than with rows.
+
+``DistinctValues`` keeps the distinct values of the few KPI columns the
+cube does not hold (such as ``id``) for the unfiltered overview. Both
+structures take appended responses from the batch alone, and those of a
+``PartitionSet`` are merged from its partitions' structures.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+from survey_data import DEFAULT_DATASET, PartitionSet, concat_columns, derived, merged_parts
+
+
+CUBE_DIMENSIONS = ("tools", "education", "motivation", "satisfaction", "industry", "experience")
+DISTINCT_COLUMNS = ("id",)
+
+
+class CountCube:
+    def __init__(self, frame, dimensions=CUBE_DIMENSIONS):
+        self.dimensions = [column for column in dimensions if column in frame.columns]
+        self.counts = (
+            frame.groupby(self.dimensions, observed=True, dropna=False)
+            .size()
+            .reset_index(name="count")
+        )
+
+    def appended(self, batch):
+        """Cube with the counts of ``batch`` added to the matching cells."""
+        return self.merged(CountCube(batch, self.dimensions))
+
+    def merged(self, other):
+        """Cube with the counts of ``other`` (same dimensions) added to the matching cells."""
+        combined = pd.DataFrame(
+            {column: concat_columns([self.counts[column], other.counts[column]]) for column in self.dimensions}
+        )
+        combined["count"] = np.concatenate([self.counts["count"].to_numpy(), other.counts["count"].to_numpy()])
+        cube = copy.copy(self)
+        cube.counts = (
+            combined.groupby(self.dimensions, observed=True, dropna=False)["count"]
+            .sum()
+            .reset_index()
+        )
+        return cube
+
+    def categorised(self):
+        """Cube whose label columns are categorical with sorted labels."""
+        cube = copy.copy(self)
+        cube.counts = self.counts.astype(
+            {column: "category" for column in self.dimensions if self.counts[column].dtype == object}
+        )
+        return cube
+
+    def slice(self, selections=None):
+        """Cube cells matching ``{column: values}``; empty value lists are ignored."""
+        cells = self.counts
+        for column, values in (selections or {}).items():
+            if values:
+                cells = cells[cells[column].isin(values)]
+        return cells
+
+    def marginal(self, by, selections=None):
+        """Respondent counts grouped by the ``by`` columns, like ``groupby(by).size()``."""
+        return (
+            self.slice(selections)
+            .groupby(list(by), observed=True)["count"]
+            .sum()
+            .reset_index()
+        )
+
+
+def load_count_cube(path=DEFAULT_DATASET):
+    """Count cube for the current version of ``path``."""
+    if isinstance(path, PartitionSet):
+        # Each partition decides on its own which columns are categorical; the
+        # set's cube uses sorted labels throughout, like one large file would.
+        return merged_parts("count_cube", lambda part: load_count_cube(part).categorised(), CountCube.merged, path)
+    return derived("count_cube", CountCube, path, columns=CUBE_DIMENSIONS)
+
+
+class DistinctValues:
+    def __init__(self, frame, columns=DISTINCT_COLUMNS):
+        self.values = {column: set(frame[column].dropna().unique()) for column in columns if column in frame.columns}
+        self.counts = {column: len(values) for column, values in self.values.items()}
+
+    def nunique(self, column):
+        """Number of distinct non-missing values of ``column``, like ``Series.nunique``."""
+        return self.counts[column]
+
+    def appended(self, batch):
+        """Counts including the values of ``batch``.
+
+        The value sets only grow and are shared with this instance, which
+        keeps reporting its own counts.
+        """
+        distinct = copy.copy(self)
+        distinct.counts = dict(self.counts)
+        for column, seen in self.values.items():
+            new = set(batch[column].dropna().unique()) - seen
+            seen |= new
+            distinct.counts[column] += len(new)
+        return distinct
+
+    def merged(self, other):
+        """Counters over the values of both instances."""
+        distinct = copy.copy(self)
+        distinct.values = {column: values | other.values.get(column, set()) for column, values in self.values.items()}
+        distinct.counts = {column: len(values) for column, values in distinct.values.items()}
+        return distinct
+
+
+def load_distinct_values(path=DEFAULT_DATASET):
+    """Distinct-value counters for the current version of ``path``."""
+    if isinstance(path, PartitionSet):
+        return merged_parts("distinct_values", load_distinct_values, DistinctValues.merged, path)
+    return derived("distinct_values", DistinctValues, path, columns=DISTINCT_COLUMNS)
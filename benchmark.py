@@ -0,0 +1,164 @@
+"""Headless benchmark of the dashboard pipeline, stage by stage.
+
+Runs the same loading, filtering, aggregation and figure code as
+``files.py`` without Streamlit and writes per-stage timings as JSON, so runs
+can be compared across releases, dataset sizes and engines.
+
+Every repeat starts cold: besides the loaded data, the shared columnar copy
+and the SQLite database are published again into fresh directories. The
+``*/warm`` stages then time loading and opening the store again from
+those files, as a second server process would. Partition sets are always
+queried with the pandas backend, which is what ``engine`` reports.
+
+    python generate_survey.py --rows 1000000
+    python benchmark.py synthetic/survey_1000000.csv --repeat 3 --output bench.json
+    python benchmark.py waves/  # a partitioned dataset, all waves
+"""
+import argparse
+import datetime
+import json
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import warnings
+
+import pandas as pd
+import plotly
+
+import charts
+import export
+import partitions
+import survey_data
+import query_engine
+import sql_backend
+from aggregate_cube import load_count_cube
+from filter_index import FILTER_COLUMNS, load_filter_index
+from sketches import load_survey_sketches
+from text_index import SEARCH
+
+
+KPI_SPEC = query_engine.DashboardSpec("kpis", metrics=charts.KPI_METRICS)
+
+warnings.filterwarnings("ignore")
+
+
+def _selection_scenarios(filter_index):
+    """A few representative sidebar states: none, one value, several columns, a keyword search."""
+    options = {column: filter_index.options(column) for column in FILTER_COLUMNS}
+    return {
+        "no_filter": {},
+        "single_industry": {"industry": options["industry"][:1]},
+        "multi_column": {
+            "tools": options["tools"][:2],
+            "education": options["education"][:2],
+            "satisfaction": options["satisfaction"][:2],
+        },
+        "keyword_search": {SEARCH: ['job "data analysis"']},
+    }
+
+
+class _Timer:
+    def __init__(self):
+        self.samples = {}
+
+    def time(self, stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+        return result
+
+    def summary(self):
+        return {
+            stage: {
+                "min": min(samples),
+                "median": statistics.median(samples),
+                "mean": statistics.fmean(samples),
+                "runs": len(samples),
+            }
+            for stage, samples in self.samples.items()
+        }
+
+
+def _fresh_directories():
+    """Point the shared copy and SQLite directories at new empty ones; returns them."""
+    directories = []
+    if survey_data.SHARED_DIR:
+        survey_data.SHARED_DIR = tempfile.mkdtemp(prefix="dashboard-bench-")
+        directories.append(survey_data.SHARED_DIR)
+    sql_backend.SQLITE_DIR = tempfile.mkdtemp(prefix="dashboard-bench-")
+    directories.append(sql_backend.SQLITE_DIR)
+    return directories
+
+
+def run_benchmark(path, repeat=3, backend=query_engine.BACKEND):
+    timer = _Timer()
+    survey = partitions.select(path)  # every wave of a partitioned dataset
+    backend = query_engine.backend_for(survey, backend)
+    rows = None
+    for _ in range(repeat):
+        directories = _fresh_directories()
+        try:
+            rows = _run_once(timer, survey, backend)
+        finally:
+            for directory in directories:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "dataset": path,
+        "rows": rows,
+        "engine": backend,
+        "repeat": repeat,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "versions": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "plotly": plotly.__version__,
+        },
+        "stages": timer.summary(),
+    }
+
+
+def _run_once(timer, survey, backend):
+    survey_data.clear_cache()
+    datahub = timer.time("load", survey_data.load_survey, survey)
+    filter_index = timer.time("build_filter_index", load_filter_index, survey)
+    timer.time("build_count_cube", load_count_cube, survey)
+    if backend == "sqlite":
+        timer.time("build_sqlite_store", sql_backend.load_sqlite_store, survey)
+    timer.time("kpis", query_engine.compute, KPI_SPEC, {}, survey, backend)
+    timer.time("build_survey_sketches", load_survey_sketches, survey)
+    timer.time("kpis_approximate", query_engine.compute, KPI_SPEC, {}, survey, backend, True)
+
+    for scenario, selections in _selection_scenarios(filter_index).items():
+        filtered = timer.time(f"{scenario}/filter", filter_index.select, datahub, selections)
+        view = timer.time(f"{scenario}/aggregate", query_engine.compute, charts.DASHBOARD_SPEC, selections, survey, backend)
+        for name, build in charts.FIGURES.items():
+            timer.time(f"{scenario}/figure/{name}", build, view[name])
+        timer.time(f"{scenario}/figure/scatter", charts.motivation_satisfaction_scatter, filtered.frame(charts.SCATTER_COLUMNS))
+        for export_format in export.EXPORT_FORMATS:
+            timer.time(f"{scenario}/export/{export_format}", export.export_bytes, filtered, export_format)
+
+    # The published files stay: another process would attach to them.
+    survey_data.clear_cache()
+    timer.time("load/warm", survey_data.load_survey, survey)
+    if backend == "sqlite":
+        timer.time("build_sqlite_store/warm", sql_backend.load_sqlite_store, survey)
+    return len(datahub)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard pipeline stages.")
+    parser.add_argument("dataset", nargs="?", default=survey_data.DEFAULT_DATASET)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", choices=query_engine.BACKENDS, default=query_engine.BACKEND)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    results = json.dumps(run_benchmark(args.dataset, args.repeat, args.backend), indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(results + "\n")
+    else:
+        print(results)
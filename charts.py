@@ -0,0 +1,240 @@
+"""Figure builders for the Data Analyst dashboard.
+
+The dashboard, the benchmark and any other consumer build their figures
+here so they all measure and render the same charts. ``DASHBOARD_SPEC``
+lists everything the dashboard pages aggregate; count-based charts plot
+the grouping of the same name from ``query_engine.run(DASHBOARD_SPEC, ...)``.
+``chart``, ``scatter`` and ``top_terms`` go through the result cache, so a selection that
+was already rendered is answered from its stored figure JSON.
+"""
+import plotly.express as px
+import plotly.io as pio
+
+from filter_index import load_filter_index
+from instrumentation import profiled, stage
+from query_engine import DashboardSpec
+from result_cache import cached
+from sketches import load_survey_sketches
+from survey_data import DEFAULT_DATASET
+
+
+CHART_DIMENSIONS = {
+    "industry_tools": ["industry", "tools"],
+    "experience_tools": ["experience", "tools"],
+    "experience": ["experience"],
+    "experience_distribution": ["motivation", "satisfaction", "industry", "experience"],
+    "motivation": ["motivation"],
+    "satisfaction": ["satisfaction"],
+}
+
+
+KPI_METRICS = {
+    "num_respondents": ("nunique", "id"),
+    "num_industry": ("nunique", "industry"),
+    "num_tools": ("nunique", "tools"),
+}
+
+DASHBOARD_SPEC = DashboardSpec("dashboard", CHART_DIMENSIONS, KPI_METRICS)
+
+
+@profiled("figure/industry_tools")
+def industry_tools_bar(counts):
+    return px.bar(
+        counts,
+        x="industry",
+        y="count",
+        color="tools",  # One trace per tool
+        title="Industry and Tools used by Analysts",
+        hover_data=["industry"],
+        template="seaborn",
+        text_auto=True
+    )
+
+
+@profiled("figure/experience_tools")
+def experience_tools_bar(counts):
+    return px.bar(
+        counts,
+        x="experience",
+        y="count",
+        color="tools",  # One trace per tool
+        title="Tools used and Years of Experience",
+        hover_data=["experience"],
+        template="seaborn",
+        text_auto=True
+    )
+
+
+@profiled("figure/experience")
+def experience_pie(counts):
+    return px.pie(
+        counts,
+        values="count",
+        names="experience",
+        title="Proportion of Experience Levels",
+        hole=0.5
+    )
+
+
+@profiled("figure/experience_distribution")
+def experience_treemap(counts):
+    path = ["motivation", "satisfaction", "industry", "experience"]
+    if counts.empty:
+        # plotly casts the path columns to str, which pandas cannot do
+        # without a copy for empty categoricals under NumPy 2.
+        counts = counts.astype({column: object for column in path})
+    return px.treemap(
+        counts,
+        path=path,
+        values="count",
+        title="Experience Distribution Across Industries",
+        template="seaborn",
+        color="experience",
+        color_continuous_scale="Viridis"
+    )
+
+
+@profiled("figure/motivation")
+def motivation_pie(counts):
+    return px.pie(
+        counts,
+        values="count",
+        names="motivation",
+        title="Motivation by Industry",
+        template="plotly_dark"
+    )
+
+
+@profiled("figure/satisfaction")
+def satisfaction_pie(counts):
+    return px.pie(
+        counts,
+        values="count",
+        names="satisfaction",
+        title="Satisfaction by Industry",
+        template="plotly_dark"
+    )
+
+
+# Row counts above which the scatter switches to WebGL, and then to a
+# server-side count grid (both axes are small integer scales, so points
+# overplot long before the browser struggles).
+SCATTER_WEBGL_ROWS = 1_000
+SCATTER_GRID_ROWS = 50_000
+SCATTER_COLUMNS = ["satisfaction_numeric", "motivation_numeric"]
+
+
+def scatter_mode(rows):
+    """``"svg"``, ``"webgl"`` or ``"grid"`` for a scatter of ``rows`` points."""
+    if rows > SCATTER_GRID_ROWS:
+        return "grid"
+    if rows > SCATTER_WEBGL_ROWS:
+        return "webgl"
+    return "svg"
+
+
+@profiled("figure/scatter")
+def motivation_satisfaction_scatter(frame, mode=None):
+    mode = mode or scatter_mode(len(frame))
+    labels = {"satisfaction_numeric": "Satisfaction", "motivation_numeric": "Motivation"}
+    if mode == "grid":
+        grid = (
+            frame.groupby(["satisfaction_numeric", "motivation_numeric"])
+            .size()
+            .reset_index(name="count")
+        )
+        return px.scatter(
+            grid,
+            x="satisfaction_numeric",
+            y="motivation_numeric",
+            size="count",
+            color="count",
+            title="Relationship Between Motivation and Satisfaction",
+            labels={**labels, "count": "Respondents"}
+        )
+    return px.scatter(
+        frame,
+        x="satisfaction_numeric",
+        y="motivation_numeric",
+        title="Relationship Between Motivation and Satisfaction",
+        labels=labels,
+        render_mode="webgl" if mode == "webgl" else "svg"
+    )
+
+
+# Free-text column -> chart label
+TEXT_LABELS = {
+    "challenge": "Challenges",
+    "valuable_skill": "Valuable Skills",
+    "balance_skills": "Balancing Skills",
+}
+TOP_TERMS = 20
+
+
+@profiled("figure/top_terms")
+def top_terms_bar(terms, column):
+    return px.bar(
+        terms,
+        x="count",
+        y="term",
+        orientation="h",
+        title=f"Top Terms in {TEXT_LABELS.get(column, column)}",
+        labels={"count": "Respondents", "term": "Term"},
+        template="seaborn"
+    ).update_yaxes(autorange="reversed")  # Most frequent on top
+
+
+FIGURES = {
+    "industry_tools": industry_tools_bar,
+    "experience_tools": experience_tools_bar,
+    "experience": experience_pie,
+    "experience_distribution": experience_treemap,
+    "motivation": motivation_pie,
+    "satisfaction": satisfaction_pie,
+}
+
+
+def _from_cache(name, selections, build, path, as_json=False):
+    result = cached(name, selections, build, path)
+    if as_json:
+        return result["figure"]
+    with stage(f"deserialise/{name}"):
+        return pio.from_json(result["figure"])
+
+
+def chart(name, view, selections=None, path=DEFAULT_DATASET, approximate=False, as_json=False):
+    """Figure for count chart ``name`` from the query results ``view``.
+
+    ``as_json`` returns the cached plotly JSON instead, without rebuilding the figure.
+    """
+    def build():
+        return {"figure": FIGURES[name](view[name]).to_json()}
+    return _from_cache(f"{name}/approximate" if approximate else name, selections, build, path, as_json)
+
+
+def approximation_note(name, selections=None, path=DEFAULT_DATASET):
+    """Error bound of chart ``name`` in approximate mode, or None if it is exact."""
+    by = CHART_DIMENSIONS[name]
+    sketches = load_survey_sketches(path)
+    if any((selections or {}).values()) or len(by) != 1 or by[0] not in sketches.frequencies:
+        return None
+    error = sketches.errors()
+    overcount = int(error["overcount"])  # counts are whole numbers
+    bound = f"at most {overcount:,} responses too high" if overcount else "exact"
+    return f"Approximate counts (count-min sketch): each is {bound}, with {error['confidence']:.0%} confidence."
+
+
+def scatter(view, selections=None, path=DEFAULT_DATASET, as_json=False):
+    """Motivation vs satisfaction scatter for the rows of a ``FilteredView``."""
+    def build():
+        frame = view.frame(SCATTER_COLUMNS)  # only the plotted columns are copied
+        return {"figure": motivation_satisfaction_scatter(frame).to_json()}
+    return _from_cache("scatter", selections, build, path, as_json)
+
+
+def top_terms(view, column, selections=None, path=DEFAULT_DATASET, as_json=False):
+    """Most frequent terms of free-text ``column`` among the rows of a ``FilteredView``."""
+    def build():
+        terms = load_filter_index(path).text.top_terms(column, view.rows, TOP_TERMS)
+        return {"figure": top_terms_bar(terms, column).to_json()}
+    return _from_cache(f"top_terms/{column}", selections, build, path, as_json)
@@ -6,6 +6,20 @@ import plotly.express as px
 import numpy as np
 import plotly.graph_objects as go
 import warnings
+import os
+
+import charts
+import data_watcher
+import export
+import instrumentation
+import partitions
+import query_engine
+import sketches
+import table_view
+from filter_index import FILTER_COLUMNS, load_filter_index
+from result_cache import results, selection_key
+from survey_data import data_version, load_survey
+from text_index import SEARCH
 
 warnings.filterwarnings("ignore")
 
@@ -16,6 +30,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# Opt-in diagnostics (DASHBOARD_PROFILE=1 or ?profile=1)
+instrumentation.start_run("data_professionals.py")
+
 
 
 
@@ -33,12 +50,29 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Load dataset
+DATASET = os.environ.get("DASHBOARD_DATASET", "newbies.csv")
 try:
-    datahub = pd.read_csv("newbies_numeric.csv")
+    # A partitioned dataset (a directory of survey waves) gets a wave selector
+    wave_options = partitions.waves(DATASET)
+    waves = st.sidebar.multiselect(
+        "Choose Survey Waves:",
+        options=wave_options,
+        default=[]
+    ) if wave_options else []
+    survey = partitions.select(DATASET, waves)  # Only the chosen waves are read
+    filter_options = {column: partitions.options(survey, column) for column in FILTER_COLUMNS}
 except FileNotFoundError:
-    st.error("The file 'newbies_numeric.csv' was not found. Please upload the file.")
+    st.error(f"The file '{DATASET}' was not found. Please upload the file.")
     st.stop()
 
+# Reload in the background when the data files change
+watching = data_watcher.watch(DATASET)
+if st.session_state.pop("data_updated", False):
+    st.toast("Data updated: showing the latest responses.")
+
+# Approximate mode, switched by the sidebar toggle (default DASHBOARD_APPROXIMATE)
+approximate = st.session_state.setdefault("approximate", sketches.APPROXIMATE)
+
 
 # Title and layout
 st.title("Data Analyst Dashboard")
@@ -49,24 +83,32 @@ kpi_cols = st.columns(3, gap="small")  # Use small gap for compact display
 
 
 # KPI calculations
-num_respondents = datahub['id'].nunique()
+overview = query_engine.run(charts.DASHBOARD_SPEC, {}, survey, approximate)
 
-num_industry= datahub['industry'].nunique()
+num_respondents = overview["num_respondents"]
 
-num_tools=datahub["tools"].nunique()
+num_industry = overview["num_industry"]
+
+num_tools = overview["num_tools"]
 
 
 col1, col2, col3 = st.columns(3)
 
 # KPI Display
+kpi_format = "≈{:,}" if approximate else "{}"
+
 with kpi_cols[0]:
-    st.metric("Number of Respondents", num_respondents)
+    st.metric("Number of Respondents", kpi_format.format(num_respondents))
 
 with kpi_cols[1]:
-    st.metric("Number of Industry", num_industry)
+    st.metric("Number of Industry", kpi_format.format(num_industry))
 
 with kpi_cols[2]:
-    st.metric("Number of Tools", num_tools)
+    st.metric("Number of Tools", kpi_format.format(num_tools))
+
+if approximate:
+    kpi_error = sketches.load_survey_sketches(survey).errors()["relative"]
+    st.caption(f"Approximate counts (HyperLogLog): within ±{kpi_error:.1%} of the exact value (one standard error).")
 
 
 
@@ -74,188 +116,191 @@ with kpi_cols[2]:
 # Sidebar filters
 tools = st.sidebar.multiselect(
     "Pick your Tools:",
-    options=datahub["tools"].unique() if "tools" in datahub.columns else [],
+    options=filter_options["tools"],
     default=[]
 )
 
 education = st.sidebar.multiselect(
     "Choose your Education Level:",
-    options=datahub["education"].unique() if "education" in datahub.columns else [],
+    options=filter_options["education"],
     default=[]
 )
 
 satisfaction = st.sidebar.multiselect(
     "Choose Satisfaction Level:",
-    options=datahub["satisfaction"].unique() if "satisfaction" in datahub.columns else [],
+    options=filter_options["satisfaction"],
     default=[]
 )
 
 industry = st.sidebar.multiselect(
     "Choose your Industry:",
-    options=datahub["industry"].unique() if "industry" in datahub.columns else [],
+    options=filter_options["industry"],
     default=[]
 )
 
-# Apply filters
-filtered_data = datahub.copy()
-if tools:
-    filtered_data = filtered_data[filtered_data["tools"].isin(tools)]
-if education:
-    filtered_data = filtered_data[filtered_data["education"].isin(education)]
-if satisfaction:
-    filtered_data = filtered_data[filtered_data["satisfaction"].isin(satisfaction)]
-if industry:
-    filtered_data = filtered_data[filtered_data["industry"].isin(industry)]
+search = st.sidebar.text_input(
+    "Search free-text answers:",
+    placeholder='e.g. job "data analysis"',
+    help="Matches challenges, valuable skills and balancing skills; quote a phrase to match it exactly."
+)
+
+st.sidebar.toggle(
+    "Approximate KPIs and pie charts",
+    key="approximate",
+    help="Read unfiltered KPIs and pie charts from HyperLogLog and count-min sketches instead of exact counts."
+)
+
+# Filter selections, applied by each section that needs rows
+selections = {
+    "tools": tools,
+    "education": education,
+    "satisfaction": satisfaction,
+    "industry": industry,
+    SEARCH: [search] if search.strip() else [],
+}
+
+# Partitions the filters rule out are never read; a plain CSV is used as is
+dataset = partitions.prune(survey, selections)
+filter_index = load_filter_index(dataset)
 
 # Display last updated time near the sidebar
 st.sidebar.markdown("#### Last Updated:")
 st.sidebar.write(datetime.datetime.now().strftime("%d %B %Y"))
 
-# Chart 1: Industry and Tools
-try:
-    fig1 = px.bar(
-        filtered_data,  # Use filtered data
-        x="industry",
-        y="tools",
-        title="Industry and Tools used by Analysts",
-        hover_data=["industry"],
-        template="seaborn",
-        text_auto=True
-    )
-except KeyError as e:
-    fig1 = None
-    st.error(f"Missing columns for 'Industry and Tools' chart: {e}")
-
-# Chart 2: Tools and Experience
-try:
-    fig2 = px.bar(
-        filtered_data,  # Use filtered data
-        x="experience",
-        y="tools",
-        title="Tools used and Years of Experience",
-        hover_data=["experience"],
-        template="seaborn",
-        text_auto=True
-    )
-except KeyError as e:
-    fig2 = None
-    st.error(f"Missing columns for 'Tools and Experience' chart: {e}")
-
-# Display Chart Pair 1
-st.title("Data Analyst Dashboard")
-st.markdown("### Industry and Tools vs Tools and Experience")
-col1, col2 = st.columns(2)
-with col1:
-    st.plotly_chart(fig1, use_container_width=True)
-with col2:
-    st.plotly_chart(fig2, use_container_width=True)
-
-# Chart 3: Proportion of Experience Levels
-try:
-    experience_counts = filtered_data["experience"].value_counts().reset_index()  # Use filtered data
-    experience_counts.columns = ["experience", "count"]
-    fig3 = px.pie(
-        experience_counts,
-        values="count",
-        names="experience",
-        title="Proportion of Experience Levels",
-        hole=0.5
-    )
-except KeyError as e:
-    fig3 = None
-    st.error(f"Missing column for 'Experience Levels' pie chart: {e}")
-
-# Chart 4: Experience Distribution Across Industries
-try:
-    experience_dist = (
-        filtered_data.groupby(["motivation", "satisfaction", "industry", "experience"])  # Use filtered data
-        .size()
-        .reset_index(name="count")
-    )
-    fig4 = px.treemap(
-        experience_dist,
-        path=["motivation", "satisfaction", "industry", "experience"],
-        values="count",
-        title="Experience Distribution Across Industries",
-        template="seaborn",
-        color="experience",
-        color_continuous_scale="Viridis"
-    )
-except KeyError as e:
-    fig4 = None
-    st.error(f"Missing columns for 'Experience Distribution' treemap: {e}")
-
-# Display Chart Pair 2
-st.markdown("### Proportion of Experience Levels and Experience Distribution")
-col3, col4 = st.columns(2)
-with col3:
-    st.plotly_chart(fig3, use_container_width=True)
-with col4:
-    st.plotly_chart(fig4, use_container_width=True)
-
-# Chart 5: Motivation by Industry
-try:
-    fig5 = px.pie(
-        experience_dist,
-        values="count",
-        names="motivation",
-        title="Motivation by Industry",
-        template="plotly_dark"
-    )
-except KeyError as e:
-    fig5 = None
-    st.error(f"Missing column for 'Motivation by Industry' pie chart: {e}")
-
-# Chart 6: Satisfaction by Industry
-try:
-    fig6 = px.pie(
-        experience_dist,
-        values="count",
-        names="satisfaction",
-        title="Satisfaction by Industry",
-        template="plotly_dark"
-    )
-except KeyError as e:
-    fig6 = None
-    st.error(f"Missing column for 'Satisfaction by Industry' pie chart: {e}")
-
-# Display Chart Pair 3
-st.markdown("### Motivation and Satisfaction by Industry")
-col5, col6 = st.columns(2)
-with col5:
-    st.plotly_chart(fig5, use_container_width=True)
-with col6:
-    st.plotly_chart(fig6, use_container_width=True)
-
-# Data view and download
-st.markdown("### View and Download Data")
-with st.expander("View Data"):
+# Chart sections
+# Each section is a fragment: its toggle reruns only that section, and a
+# hidden section computes no aggregates or figures at all.
+def show_chart(column, name, label):
+    try:
+        view = query_engine.run(charts.DASHBOARD_SPEC, selections, dataset, approximate)  # Use filtered counts
+        fig = charts.chart(name, view, selections, dataset, approximate)
+    except KeyError as e:
+        st.error(f"Missing columns for {label}: {e}")
+        return
+    with column, instrumentation.stage(f"render/{name}"):
+        st.plotly_chart(fig, use_container_width=True)
+        note = approximate and charts.approximation_note(name, selections, dataset)
+        if note:
+            st.caption(note)
+
+
+@st.fragment
+def chart_pair(heading, left, right):
+    st.markdown(f"### {heading}")
+    if not st.toggle("Show charts", value=True, key=f"show_{left[0]}"):
+        return
+    col_left, col_right = st.columns(2)
+    show_chart(col_left, *left)
+    show_chart(col_right, *right)
+
+
+@st.fragment
+def data_section():
+    st.markdown("### View and Download Data")
+    if not st.toggle("View Data", value=False, key="show_data"):
+        return
+    filtered_data = filter_index.select(load_survey(dataset), selections)  # Row positions only
     try:
-        st.write(filtered_data)  # Use filtered data
+        with instrumentation.stage("render/data_view"):
+            table_view.show_table(filtered_data, selections, dataset)  # One page of the filtered data
     except Exception as e:
         st.error(f"Error displaying data: {e}")
 
+    # The export is built only after "Prepare download" is clicked for the
+    # current filters and format, then reused from the export cache.
     try:
-        csv = filtered_data.to_csv(index=False).encode("utf-8")  # Use filtered data
-        st.download_button(
-            label="Download Filtered Dataset",
-            data=csv,
-            file_name="filtered_data.csv",
-            mime="text/csv"
-        )
+        export_format = st.selectbox("Download format", list(export.EXPORT_FORMATS), key="export_format")
+        file_name, mime = export.EXPORT_FORMATS[export_format]
+        # A new data version (reload, append, other waves) needs a new click
+        export_request = (data_version(dataset), selection_key(selections), export_format)
+        if st.button("Prepare download", key="prepare_export"):
+            st.session_state["export_request"] = export_request
+        if st.session_state.get("export_request") == export_request:
+            with instrumentation.stage("export"):
+                data = export.cached_export(filtered_data, export_format, selections, dataset)  # Use filtered data
+            st.download_button(
+                label="Download Filtered Dataset",
+                data=data,
+                file_name=file_name,
+                mime=mime
+            )
     except Exception as e:
         st.error(f"Error preparing data for download: {e}")
 
+
+@st.fragment
+def scatter_section():
+    st.markdown("### Scatter Plot: Motivation vs Satisfaction")
+    if not st.toggle("Show scatter plot", value=True, key="show_scatter"):
+        return
+    try:
+        # Only the plotted columns are loaded
+        filtered_data = filter_index.select(load_survey(dataset, columns=charts.SCATTER_COLUMNS), selections)
+        scatter_fig = charts.scatter(filtered_data, selections, dataset)  # Use filtered data
+        with instrumentation.stage("render/scatter"):
+            st.plotly_chart(scatter_fig, use_container_width=True)
+    except KeyError as e:
+        st.error(f"Missing columns for scatter plot: {e}")
+
+
+@st.fragment
+def terms_section():
+    st.markdown("### Top Terms in Free-text Answers")
+    if not st.toggle("Show top terms", value=True, key="show_terms"):
+        return
+    column = st.selectbox("Answers", list(charts.TEXT_LABELS), format_func=charts.TEXT_LABELS.get, key="terms_column")
+    try:
+        filtered_data = filter_index.select(load_survey(dataset, columns=[column]), selections)  # Row positions only
+        terms_fig = charts.top_terms(filtered_data, column, selections, dataset)
+        with instrumentation.stage("render/top_terms"):
+            st.plotly_chart(terms_fig, use_container_width=True)
+    except KeyError as e:
+        st.error(f"Missing columns for top terms chart: {e}")
+
+
+st.title("Data Analyst Dashboard")
+
+# Chart Pair 1: Industry and Tools, Tools and Experience
+chart_pair(
+    "Industry and Tools vs Tools and Experience",
+    ("industry_tools", "'Industry and Tools' chart"),
+    ("experience_tools", "'Tools and Experience' chart"),
+)
+
+# Chart Pair 2: Proportion of Experience Levels, Experience Distribution Across Industries
+chart_pair(
+    "Proportion of Experience Levels and Experience Distribution",
+    ("experience", "'Experience Levels' pie chart"),
+    ("experience_distribution", "'Experience Distribution' treemap"),
+)
+
+# Chart Pair 3: Motivation by Industry, Satisfaction by Industry
+chart_pair(
+    "Motivation and Satisfaction by Industry",
+    ("motivation", "'Motivation by Industry' pie chart"),
+    ("satisfaction", "'Satisfaction by Industry' pie chart"),
+)
+
+# Data view and download
+data_section()
+
 # Scatter Plot: Motivation vs Satisfaction
-st.markdown("### Scatter Plot: Motivation vs Satisfaction")
-try:
-    scatter_fig = px.scatter(
-        filtered_data,  # Use filtered data
-        x="satisfaction_numeric",
-        y="motivation_numeric",
-        title="Relationship Between Motivation and Satisfaction",
-        labels={"satisfaction_numeric": "Satisfaction", "motivation_numeric": "Motivation"}
-    )
-    st.plotly_chart(scatter_fig, use_container_width=True)
-except KeyError as e:
-    st.error(f"Missing columns for scatter plot: {e}")
+scatter_section()
+
+# Top terms of the free-text answers
+terms_section()
+
+# Data refresh: rerun once the watcher has reloaded the data
+@st.fragment(run_every=data_watcher.POLL_SECONDS if watching else None)
+def data_updates():
+    changes = data_watcher.changes()
+    if st.session_state.setdefault("data_changes", changes) != changes:
+        st.session_state["data_changes"] = changes
+        st.session_state["data_updated"] = True
+        st.rerun()
+
+
+data_updates()
+
+instrumentation.note("result_cache", results.stats())
+instrumentation.finish_run()
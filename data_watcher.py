@@ -0,0 +1,118 @@
+"""Background reload of the survey when its files change.
+
+``watch`` starts one ``watchdog`` observer per process on the directory of
+a dataset (recursively for a partitioned one). Edits to a watched file are
+debounced for ``DASHBOARD_WATCH_DEBOUNCE`` seconds, then a single
+background reload loads the new version (only the new lines of a CSV that
+was appended to) and brings the derived structures that were in use up to
+date (``survey_data.refresh``), drops the cached results and figures of
+the replaced version and bumps the ``changes`` counter. Other datasets keep
+their caches.
+
+Pages poll ``changes`` from a small fragment every ``DASHBOARD_WATCH_POLL``
+seconds and rerun once when it moves, so live sessions pick up the new data
+without a server restart and without parsing it themselves. Set
+``DASHBOARD_WATCH=0`` to turn watching off; datasets are then re-read on
+the first request after a change, as before.
+"""
+import logging
+import os
+import threading
+
+from partitions import MANIFEST
+from result_cache import discard_versions
+from survey_data import ARROW_SUFFIX, PartitionSet, arrow_path, refresh
+
+
+WATCH = os.environ.get("DASHBOARD_WATCH", "1").strip().lower() not in ("", "0", "false", "no", "off")
+DEBOUNCE_SECONDS = float(os.environ.get("DASHBOARD_WATCH_DEBOUNCE", 0.5))
+POLL_SECONDS = float(os.environ.get("DASHBOARD_WATCH_POLL", 2))
+# Opening or reading a file (as the reload itself does) is not a change.
+CHANGE_EVENTS = ("created", "modified", "moved", "deleted", "closed")
+
+_lock = threading.Lock()
+_observer = None
+_watched = set()  # absolute paths of watched CSV files and partition directories
+_pending = {}  # changed file -> debounce timer
+_changes = 0
+_logger = logging.getLogger(__name__)
+
+
+def changes():
+    """Number of data reloads in this process so far."""
+    return _changes
+
+
+def _dataset_file(path):
+    """The watched file or partition directory that a change to ``path`` affects, if any."""
+    if path in _watched:
+        return path
+    if path.endswith(ARROW_SUFFIX):
+        source = os.path.splitext(path)[0] + ".csv"
+        if source in _watched and arrow_path(source) == path:
+            return source
+    for directory in _watched:
+        if path.startswith(directory + os.sep):
+            if path.endswith(".csv") or os.path.basename(path) == MANIFEST:
+                return path
+    return None
+
+
+def _reload(path):
+    global _changes
+    with _lock:
+        _pending.pop(path, None)
+    try:
+        # A new manifest only changes the waves on offer; its files report their own changes.
+        if os.path.basename(path) != MANIFEST:
+            discard_versions(refresh(path))
+    except Exception:
+        _logger.exception("Reloading %s failed", path)
+        return
+    with _lock:
+        _changes += 1
+
+
+class _Handler:
+    """Receives watchdog events for every watched directory."""
+
+    def dispatch(self, event):
+        if event.is_directory or event.event_type not in CHANGE_EVENTS:
+            return
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            target = path and _dataset_file(os.path.abspath(path))
+            if target:
+                with _lock:
+                    timer = _pending.pop(target, None)
+                    if timer is not None:
+                        timer.cancel()
+                    # Writers touch a file several times; reload once they are done.
+                    timer = _pending[target] = threading.Timer(DEBOUNCE_SECONDS, _reload, [target])
+                    timer.daemon = True
+                    timer.start()
+
+
+def watch(path):
+    """Watch the files of dataset ``path``; returns False if watching is off or unavailable."""
+    global _observer
+    if not WATCH:
+        return False
+    path = os.path.abspath(path.directory if isinstance(path, PartitionSet) else path)
+    with _lock:
+        if path in _watched:
+            return True
+        try:
+            from watchdog.observers import Observer
+        except ImportError:
+            return False
+        partitioned = os.path.isdir(path)
+        directory = path if partitioned else os.path.dirname(path)
+        if not os.path.isdir(directory):
+            return False
+        if _observer is None:
+            _observer = Observer()
+            _observer.daemon = True
+            _observer.start()
+        _observer.schedule(_Handler(), directory, recursive=partitioned)
+        _watched.add(path)
+    return True
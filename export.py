@@ -0,0 +1,87 @@
+"""On-demand exports of the filtered survey.
+
+Exports are produced only when the user asks for one and written in chunks
+of ``CHUNK_ROWS`` rows, each copied out of the filtered view on its own, so
+neither the filtered table nor a full CSV string is ever built. Finished
+exports are kept in a small LRU per data version, filter selection and
+format so repeated downloads of the same view are free.
+"""
+import gzip
+import io
+import os
+
+from result_cache import ResultCache, cached
+
+
+CHUNK_ROWS = 100_000
+
+# Label -> (file name, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("filtered_data.csv", "text/csv"),
+    "CSV (gzip)": ("filtered_data.csv.gz", "application/gzip"),
+    "Parquet": ("filtered_data.parquet", "application/vnd.apache.parquet"),
+}
+
+exports = ResultCache(int(os.environ.get("DASHBOARD_EXPORT_CACHE_SIZE", 8)))
+
+
+def _chunks(view, chunk_rows):
+    for start in range(0, max(len(view), 1), chunk_rows):
+        yield start, view.frame(start=start, stop=start + chunk_rows)
+
+
+def iter_csv_chunks(view, chunk_rows=CHUNK_ROWS):
+    """Encoded CSV for a ``FilteredView``, ``chunk_rows`` rows at a time."""
+    for start, chunk in _chunks(view, chunk_rows):
+        yield chunk.to_csv(index=False, header=start == 0).encode("utf-8")
+
+
+def _parquet_schema(frame):
+    """Arrow schema for every chunk of ``frame``, taken from its dtypes.
+
+    Object columns are strings: inferred per chunk, a chunk whose values are
+    all missing would come out ``null``-typed and not match the file.
+    """
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(frame.iloc[:0], preserve_index=False)
+    for position, column in enumerate(frame.columns):
+        if frame[column].dtype == object:
+            schema = schema.set(position, pa.field(column, pa.string()))
+    return schema
+
+
+def _write_parquet(view, fh, chunk_rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(view.base)
+    with pq.ParquetWriter(fh, schema) as writer:
+        for _, chunk in _chunks(view, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def write_export(view, export_format, fh, chunk_rows=CHUNK_ROWS):
+    """Stream the rows of ``view`` to the binary file ``fh`` in ``export_format``."""
+    if export_format == "Parquet":
+        _write_parquet(view, fh, chunk_rows)
+    elif export_format == "CSV (gzip)":
+        with gzip.GzipFile(fileobj=fh, mode="wb") as gz:
+            for chunk in iter_csv_chunks(view, chunk_rows):
+                gz.write(chunk)
+    elif export_format == "CSV":
+        for chunk in iter_csv_chunks(view, chunk_rows):
+            fh.write(chunk)
+    else:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+
+def export_bytes(view, export_format):
+    buffer = io.BytesIO()
+    write_export(view, export_format, buffer)
+    return buffer.getvalue()
+
+
+def cached_export(view, export_format, selections, path):
+    """Export bytes for the rows ``selections`` kept from ``path``."""
+    return cached(f"export/{export_format}", selections, lambda: export_bytes(view, export_format), path, cache=exports)
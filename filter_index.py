@@ -0,0 +1,201 @@
+"""Bitmap index over the sidebar filter columns.
+
+One bit-packed bitmap is kept per distinct value of every filterable
+column. A sidebar selection is answered by OR-ing the bitmaps of the picked
+values within a column and AND-ing the columns together.
+
+``select`` returns a ``FilteredView``: the shared base frame plus the
+positions of the selected rows. Sessions hold only those positions; rows
+are copied out only when a chart or export asks for contiguous data, and
+then only for the columns it needs.
+
+Keyword searches over the free-text answers (the ``SEARCH`` entry of a
+selection) are answered by the ``TextIndex`` kept alongside the bitmaps
+and AND-ed with the other columns.
+
+Appended responses extend every bitmap by the batch's bits, so the index
+follows new data without being rebuilt. Bitmaps are views of buffers with
+headroom: an append writes the batch's bits in place and copies a bitmap
+only when its buffer is full, so it costs about the batch's size per
+value rather than the survey's. The index of a ``PartitionSet`` is
+merged the same way from the indexes of its partitions.
+"""
+import copy
+import threading
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import profiled
+from survey_data import DEFAULT_DATASET, PartitionSet, derived, merged_parts
+from text_index import SEARCH, TEXT_COLUMNS, TextIndex
+
+
+FILTER_COLUMNS = ("tools", "education", "satisfaction", "industry")
+
+_buffer_lock = threading.Lock()
+
+
+class FilteredView:
+    def __init__(self, base, rows=None):
+        self.base = base
+        self.rows = rows  # positions into base, or None for every row
+
+    def __len__(self):
+        return len(self.base) if self.rows is None else len(self.rows)
+
+    @property
+    def columns(self):
+        return self.base.columns
+
+    def frame(self, columns=None, start=0, stop=None):
+        """Materialise rows ``start:stop`` of the view, optionally only ``columns``."""
+        base = self.base if columns is None else self.base[list(columns)]
+        if self.rows is None:
+            if start == 0 and stop is None:
+                return base
+            return base.iloc[start:stop]
+        return base.iloc[self.rows[start:stop]]
+
+
+class FilterIndex:
+    def __init__(self, frame, columns=FILTER_COLUMNS, text_columns=TEXT_COLUMNS):
+        self.size = len(frame)
+        self.text = TextIndex(frame, text_columns)
+        self.bitmaps = {}
+        for column in columns:
+            if column not in frame.columns:
+                continue
+            codes, uniques = pd.factorize(frame[column])
+            self.bitmaps[column] = {
+                value: np.packbits(codes == code)
+                for code, value in enumerate(uniques)
+            }
+        self._buffers = {}  # (column, value) -> _Bits its bitmap is a view of, once appended to
+
+    def appended(self, batch):
+        """Index over the existing rows followed by the rows of ``batch``."""
+        index = copy.copy(self)
+        index.size = self.size + len(batch)
+        index.text = self.text.appended(batch)
+        index.bitmaps, index._buffers = {}, dict(self._buffers)
+        for column, bitmaps in self.bitmaps.items():
+            codes, uniques = pd.factorize(batch[column])
+            positions = {value: code for code, value in enumerate(uniques)}
+            index.bitmaps[column] = {}
+            for value in [*bitmaps, *(value for value in uniques if value not in bitmaps)]:
+                bits = codes == positions[value] if value in positions else np.zeros(len(batch), dtype=bool)
+                index._extend(column, value, bitmaps.get(value), self.size, bits)
+        return index
+
+    def merged(self, other):
+        """Index over the rows of this index followed by the rows of ``other``."""
+        index = copy.copy(self)
+        index.size = self.size + other.size
+        index.text = self.text.merged(other.text)
+        index.bitmaps, index._buffers = {}, dict(self._buffers)
+        for column, bitmaps in self.bitmaps.items():
+            others = other.bitmaps.get(column, {})
+            index.bitmaps[column] = {}
+            for value in [*bitmaps, *(value for value in others if value not in bitmaps)]:
+                if value in others:
+                    bits = np.unpackbits(others[value], count=other.size).astype(bool)
+                else:
+                    bits = np.zeros(other.size, dtype=bool)
+                index._extend(column, value, bitmaps.get(value), self.size, bits)
+        return index
+
+    def _extend(self, column, value, packed, size, bits):
+        """Set the bitmap of ``value`` to ``packed`` (``size`` bits, or None for none set) followed by ``bits``."""
+        if packed is None:
+            packed = np.zeros((size + 7) // 8, dtype=np.uint8)
+        buffer, packed = _append_bits(self._buffers.get((column, value)), packed, size, bits)
+        self._buffers[(column, value)] = buffer
+        self.bitmaps[column][value] = packed
+
+    def options(self, column):
+        """Distinct values of ``column`` in order of first appearance."""
+        return list(self.bitmaps.get(column, ()))
+
+    def mask(self, selections=None):
+        """Boolean row mask for ``{column: values}``, or None if nothing is selected.
+
+        ``selections[SEARCH]`` holds keyword queries over the free-text columns.
+        """
+        selections = selections or {}
+        packed = None
+        matched = self.text.mask(selections.get(SEARCH) or ())
+        if matched is not None:
+            packed = np.packbits(matched)
+        for column, values in selections.items():
+            if not values or column not in self.bitmaps:
+                continue
+            bitmaps = self.bitmaps[column]
+            column_bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+            for value in values:
+                if value in bitmaps:
+                    column_bits |= bitmaps[value]
+            packed = column_bits if packed is None else packed & column_bits
+        if packed is None:
+            return None
+        return np.unpackbits(packed, count=self.size).astype(bool)
+
+    @profiled("filter")
+    def select(self, frame, selections=None):
+        """View of the rows of ``frame`` matching ``selections``."""
+        mask = self.mask(selections)
+        if mask is None:
+            return FilteredView(frame)
+        rows = np.flatnonzero(mask)
+        return FilteredView(frame, rows.astype(np.int32) if self.size < 2**31 else rows)
+
+    def apply(self, frame, selections):
+        """Rows of ``frame`` matching ``selections`` as a DataFrame."""
+        return self.select(frame, selections).frame()
+
+
+class _Bits:
+    """Bit-packed bitmap with room for more rows.
+
+    An index and the indexes appended to it share one buffer and each reads
+    only its own leading bits. ``used`` counts the bits written so far, so
+    only an index holding all of them adds more in place.
+    """
+
+    def __init__(self, packed, size, capacity):
+        self.data = np.zeros(capacity, dtype=np.uint8)
+        self.data[:len(packed)] = packed
+        if size % 8:
+            # Bits past ``size`` may belong to another index appended to ``packed``.
+            self.data[size // 8] &= (0xFF << (8 - size % 8)) & 0xFF
+        self.used = size
+
+
+def _append_bits(buffer, packed, size, bits):
+    """``(buffer, packed)`` for ``packed`` (holding ``size`` bits) followed by ``bits``.
+
+    The bits are written into ``buffer`` when it has room and nothing was
+    added to it past ``size``; otherwise into a new buffer with headroom, so
+    repeated appends copy the existing bits only now and then. Unused bytes
+    are zero, so appending unset bits writes nothing.
+    """
+    total = size + len(bits)
+    length = (total + 7) // 8
+    with _buffer_lock:
+        if buffer is None or buffer.used != size or len(buffer.data) < length:
+            buffer = _Bits(packed, size, length + length // 8 + 8)
+        buffer.used = total
+    if bits.any():
+        start, tail = divmod(size, 8)
+        if tail:
+            # Refill the partly used last byte before packing the rest.
+            bits = np.concatenate([np.unpackbits(buffer.data[start:start + 1], count=tail).astype(bool), bits])
+        buffer.data[start:start + (len(bits) + 7) // 8] = np.packbits(bits)
+    return buffer, buffer.data[:length]
+
+
+def load_filter_index(path=DEFAULT_DATASET):
+    """Filter index for the current version of ``path``."""
+    if isinstance(path, PartitionSet):
+        return merged_parts("filter_index", load_filter_index, FilterIndex.merged, path)
+    return derived("filter_index", FilterIndex, path, columns=[*FILTER_COLUMNS, *TEXT_COLUMNS])
@@ -0,0 +1,68 @@
+"""Generate synthetic survey tables shaped like the encoded ``newbies.csv``.
+
+Every answer column is sampled from the frequencies observed in the real
+survey, and the normalised labels and ``*_numeric`` columns are derived
+with ``survey_encoding.encode``, so the synthetic data has the same
+columns, category sets and marginal distributions as the loaded survey. Rows are written in chunks to
+keep memory bounded at any size.
+
+    python generate_survey.py --rows 10000 1000000 10000000 --out-dir synthetic
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from survey_data import DEFAULT_DATASET, write_arrow
+from survey_encoding import NUMERIC_CODES, encode
+
+
+def _column_models(source):
+    """Observed values and their frequencies for every non-id column."""
+    models = {}
+    for column in source.columns:
+        if column == "id" or column in NUMERIC_CODES:
+            continue
+        frequencies = source[column].value_counts(normalize=True, dropna=False)
+        models[column] = (frequencies.index.to_numpy(dtype=object), frequencies.to_numpy())
+    return models
+
+
+def generate_chunks(rows, source=DEFAULT_DATASET, seed=0, chunk_size=1_000_000):
+    """Yield synthetic survey frames totalling ``rows`` rows."""
+    real = pd.read_csv(source)
+    models = _column_models(real)
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, rows, chunk_size):
+        size = min(chunk_size, rows - start)
+        chunk = {"id": np.arange(start + 1, start + size + 1)}
+        for column, (values, weights) in models.items():
+            chunk[column] = values[rng.choice(len(values), size=size, p=weights)]
+        yield encode(pd.DataFrame(chunk, columns=real.columns))
+
+
+def write_survey(rows, out_path, source=DEFAULT_DATASET, seed=0, chunk_size=1_000_000):
+    """Write a ``rows``-row synthetic survey CSV to ``out_path``."""
+    for number, chunk in enumerate(generate_chunks(rows, source, seed, chunk_size)):
+        chunk.to_csv(out_path, mode="w" if number == 0 else "a", header=number == 0, index=False)
+    return out_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic survey tables.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--out-dir", default="synthetic")
+    parser.add_argument("--source", default=DEFAULT_DATASET, help="survey to take distributions from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--arrow", action="store_true", help="also write a columnar .arrow copy")
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    for rows in args.rows:
+        out_path = os.path.join(args.out_dir, f"survey_{rows}.csv")
+        write_survey(rows, out_path, args.source, args.seed)
+        print(f"wrote {rows} rows to {out_path}")
+        if args.arrow:
+            print(f"wrote {write_arrow(out_path)}")
@@ -0,0 +1,73 @@
+"""Append-only ingestion of new survey responses.
+
+``ingest`` derives the encoded columns of a batch of raw responses
+(``survey_encoding.encode``), checks it against the columns of the loaded
+survey, appends the raw answers to the CSV and updates the cached survey
+together with its filter index, count cube and KPI counters from the batch
+alone, so the dashboards served by this process show the new numbers
+without re-reading or re-aggregating the whole file. Other processes see that the CSV only
+grew and load the new lines the same way (``survey_data``).
+
+    python ingest.py new_responses.csv --dataset newbies.csv
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from survey_data import DEFAULT_DATASET, append_rows, schema
+from survey_encoding import encode
+
+
+class BatchError(ValueError):
+    """A response batch that does not fit the survey's columns."""
+
+
+def validate_batch(batch, dtypes):
+    """``batch`` reordered and converted to the survey's ``dtypes``.
+
+    Raises ``BatchError`` for missing or unknown columns and for values
+    that cannot be stored in their column.
+    """
+    missing = [column for column in dtypes if column not in batch.columns]
+    unknown = [column for column in batch.columns if column not in dtypes]
+    if missing or unknown:
+        raise BatchError(f"Batch columns do not match the survey: missing {missing}, unknown {unknown}")
+
+    columns = {}
+    for column, dtype in dtypes.items():
+        values = batch[column].reset_index(drop=True)
+        if pd.api.types.is_numeric_dtype(dtype):
+            converted = pd.to_numeric(values, errors="coerce")
+            invalid = converted.isna() & values.notna()
+            if invalid.any():
+                raise BatchError(f"Non-numeric values in {column!r}: {values[invalid].unique().tolist()}")
+            if np.issubdtype(dtype, np.integer) and converted.isna().any():
+                raise BatchError(f"Missing values in integer column {column!r}")
+            columns[column] = converted.astype(dtype)
+        else:
+            values = values.map(str, na_action="ignore").astype(object)
+            columns[column] = values.astype("category") if isinstance(dtype, pd.CategoricalDtype) else values
+    return pd.DataFrame(columns)
+
+
+def ingest(batch, path=DEFAULT_DATASET):
+    """Validate ``batch`` and append it to the survey at ``path``; returns the rows added.
+
+    The CSV receives the answers as given; the encoded rows only update the
+    loaded survey.
+    """
+    encoded = validate_batch(encode(batch), schema(path))
+    if encoded.empty:
+        return 0
+    return append_rows(encoded, path, raw=batch.reset_index(drop=True))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append new survey responses to the dataset.")
+    parser.add_argument("batches", nargs="+", help="CSV files of new responses")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="survey CSV to append to")
+    args = parser.parse_args()
+    for batch_path in args.batches:
+        added = ingest(pd.read_csv(batch_path), args.dataset)
+        print(f"{batch_path}: {added} rows -> {args.dataset}")
@@ -0,0 +1,205 @@
+"""Opt-in per-stage timing and memory probes for the dashboards.
+
+Profiling is off unless ``DASHBOARD_PROFILE=1`` is set in the environment or
+the page is opened with ``?profile=1``. A script calls ``start_run`` at the
+top and ``finish_run`` at the bottom; in between, code wrapped in ``stage``
+(or decorated with ``profiled``) records wall time, Python allocations
+(tracemalloc) and process RSS. Results are shown in a sidebar
+"Diagnostics" panel and appended as JSON lines to ``DASHBOARD_PROFILE_LOG``
+(default ``dashboard_profile.log``).
+
+When profiling is off, ``stage`` costs one thread-local lookup and returns a
+shared no-op context manager, so the probes can stay in production code.
+"""
+import contextlib
+import datetime
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+
+ENV_FLAG = "DASHBOARD_PROFILE"
+LOG_ENV = "DASHBOARD_PROFILE_LOG"
+QUERY_PARAM = "profile"
+
+_NULL_STAGE = contextlib.nullcontext()
+_current = threading.local()
+_runs = {}  # script thread -> its unfinished profiler
+_tracing_lock = threading.Lock()
+_tracing_runs = 0
+_logger = None
+
+
+def _flag(value):
+    return str(value).strip().lower() not in ("", "0", "false", "no", "off")
+
+
+def enabled():
+    """Whether profiling was requested by env var or query parameter."""
+    if _flag(os.environ.get(ENV_FLAG, "")):
+        return True
+    try:
+        import streamlit as st
+
+        return _flag(st.query_params.get(QUERY_PARAM, ""))
+    except Exception:
+        return False
+
+
+def rss_bytes(pid="self"):
+    """Resident set size of process ``pid``, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        logger = logging.getLogger("dashboard.profile")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(logging.FileHandler(os.environ.get(LOG_ENV, "dashboard_profile.log")))
+        _logger = logger
+    return _logger
+
+
+class Profiler:
+    def __init__(self, page):
+        global _tracing_runs
+        self.page = page
+        self.records = []
+        self.notes = {}
+        self.depth = 0
+        self.started = time.perf_counter()
+        self.closed = False
+        with _tracing_lock:
+            if _tracing_runs == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            _tracing_runs += 1
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        outermost = self.depth == 0
+        if outermost:
+            tracemalloc.reset_peak()
+        allocated_before = tracemalloc.get_traced_memory()[0]
+        rss_before = rss_bytes()
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.depth -= 1
+            allocated, peak = tracemalloc.get_traced_memory()
+            rss = rss_bytes()
+            self.records.append({
+                "stage": name,
+                "seconds": seconds,
+                "allocated_bytes": allocated - allocated_before,
+                "peak_bytes": peak - allocated_before if outermost else None,
+                "rss_bytes": rss,
+                "rss_delta_bytes": rss - rss_before if rss is not None and rss_before is not None else None,
+            })
+
+    def close(self):
+        global _tracing_runs
+        with _tracing_lock:
+            if self.closed:
+                return
+            self.closed = True
+            _tracing_runs -= 1
+            if _tracing_runs == 0:
+                tracemalloc.stop()
+
+    def summary(self):
+        return {
+            "page": self.page,
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "total_seconds": time.perf_counter() - self.started,
+            "rss_bytes": rss_bytes(),
+            "notes": self.notes,
+            "stages": self.records,
+        }
+
+
+def start_run(page):
+    """Begin profiling one script run when profiling is enabled.
+
+    Runs that never reached ``finish_run`` (``st.stop``, an exception, a
+    client disconnect) are closed here. Streamlit gives each run a new
+    thread, so their profilers are found by their finished threads, not in
+    this thread's state.
+    """
+    thread = threading.current_thread()
+    with _tracing_lock:
+        unfinished = [other for other in _runs if other is thread or not other.is_alive()]
+        unfinished = [_runs.pop(other) for other in unfinished]
+    for profiler in unfinished:
+        profiler.close()
+    profiler = _current.profiler = Profiler(page) if enabled() else None
+    if profiler is not None:
+        with _tracing_lock:
+            _runs[thread] = profiler
+    return profiler
+
+
+def stage(name):
+    """Context manager timing ``name`` in the active run; a no-op otherwise."""
+    profiler = getattr(_current, "profiler", None)
+    if profiler is None:
+        return _NULL_STAGE
+    return profiler.stage(name)
+
+
+def profiled(name):
+    """Decorator recording every call of the wrapped function as stage ``name``."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def note(name, value):
+    """Attach an extra value (e.g. cache counters) to the active run."""
+    profiler = getattr(_current, "profiler", None)
+    if profiler is not None:
+        profiler.notes[name] = value
+
+
+def finish_run():
+    """Show the diagnostics panel and log the run, if it was profiled."""
+    profiler = getattr(_current, "profiler", None)
+    _current.profiler = None
+    if profiler is None:
+        return
+    with _tracing_lock:
+        _runs.pop(threading.current_thread(), None)
+    profiler.close()
+    summary = profiler.summary()
+    _get_logger().info(json.dumps(summary))
+
+    import pandas as pd
+    import streamlit as st
+
+    with st.sidebar.expander("Diagnostics", expanded=True):
+        st.metric("Rerun time", f"{summary['total_seconds'] * 1000:.0f} ms")
+        if summary["rss_bytes"] is not None:
+            st.metric("Process RSS", f"{summary['rss_bytes'] / 2**20:.0f} MiB")
+        for name, value in summary["notes"].items():
+            st.caption(f"{name}: {value}")
+        table = pd.DataFrame(summary["stages"], columns=["stage", "seconds", "allocated_bytes", "peak_bytes", "rss_delta_bytes"])
+        table["ms"] = table.pop("seconds") * 1000
+        for column in ("allocated_bytes", "peak_bytes", "rss_delta_bytes"):
+            table[column.replace("_bytes", "_mib")] = pd.to_numeric(table.pop(column)) / 2**20
+        st.dataframe(table.round(2), hide_index=True, use_container_width=True)
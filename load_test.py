@@ -0,0 +1,254 @@
+"""Concurrent load test of a dashboard page against a local Streamlit server.
+
+For each concurrency level a fresh ``streamlit run <script>`` server is
+started and N simulated users connect to it over the same websocket
+protocol the browser uses. Each user loads the page once, then repeatedly
+sends a rerun with a random sidebar selection and waits for the script to
+finish; that round trip is the rerun latency. Per level the harness
+reports p50/p95/p99 latency, reruns per second and the server's peak RSS.
+
+``AppTest`` cannot drive sessions concurrently (it sets up and tears down
+a process-wide runtime per run), so a real server is used; it also makes
+the sessions share caches and threads exactly as they would in
+production.
+
+    python load_test.py files.py --concurrency 1 4 16 --reruns 20
+    DASHBOARD_DATASET=synthetic/survey_1000000.csv python load_test.py data_professionals.py
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from tornado.websocket import websocket_connect
+
+from instrumentation import rss_bytes
+
+
+PERCENTILES = (50, 95, 99)
+SIDEBAR = 1  # root container index of st.sidebar in delta paths
+
+
+class _RssSampler(threading.Thread):
+    """Background thread keeping the highest RSS of ``pid`` seen until stopped."""
+
+    def __init__(self, pid, interval=0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = rss_bytes(pid)
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            rss = rss_bytes(self.pid)
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return self.peak
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(script, port, timeout=60):
+    """Start ``streamlit run script`` on ``port`` and wait until it is healthy."""
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", script,
+            "--server.headless", "true",
+            "--server.port", str(port),
+            "--browser.gatherUsageStats", "false",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"streamlit exited with code {server.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://localhost:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"streamlit did not start within {timeout} s")
+
+
+class _Session:
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.connection = None
+        self.filters = []  # (widget id, option count) of the sidebar multiselects
+
+    async def connect(self):
+        self.connection = await websocket_connect(self.url, max_message_size=1 << 30)
+
+    async def rerun(self, widgets=()):
+        """Rerun the page with ``widgets`` as (id, indices) pairs; returns the exceptions it showed."""
+        message = BackMsg()
+        message.rerun_script.SetInParent()
+        for widget_id, indices in widgets:
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            state.int_array_value.data.extend(indices)
+        await self.connection.write_message(message.SerializeToString(), binary=True)
+
+        self.filters = []  # this run draws the sidebar again
+        exceptions = []
+        while True:
+            data = await asyncio.wait_for(self.connection.read_message(), self.timeout)
+            if data is None:
+                raise RuntimeError("server closed the session")
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            kind = forward.WhichOneof("type")
+            if kind == "script_finished":
+                return exceptions
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                if element.WhichOneof("type") == "exception":
+                    exceptions.append(f"{element.exception.type}: {element.exception.message}")
+                elif element.WhichOneof("type") == "multiselect" and forward.metadata.delta_path[0] == SIDEBAR:
+                    self.filters.append((element.multiselect.id, len(element.multiselect.options)))
+
+    def random_selection(self, rng, pick_probability=0.5):
+        widgets = []
+        for widget_id, count in self.filters:
+            if count and rng.random() < pick_probability:
+                widgets.append((widget_id, sorted(rng.sample(range(count), rng.randint(1, count)))))
+            else:
+                widgets.append((widget_id, []))
+        return widgets
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+async def _simulate(url, reruns, seed, timeout, start, latencies, errors):
+    rng = random.Random(seed)
+    session = _Session(url, timeout)
+    try:
+        try:
+            await session.connect()
+            await session.rerun()
+        except Exception:
+            await start.abort()  # release the other sessions and the driver
+            raise
+        await start.wait()  # every session has loaded the page
+        for _ in range(reruns):
+            widgets = session.random_selection(rng)
+            began = time.perf_counter()
+            exceptions = await session.rerun(widgets)
+            latencies.append(time.perf_counter() - began)
+            errors += exceptions
+    finally:
+        session.close()
+
+
+async def _drive(url, sessions, reruns, seed, timeout, latencies, errors, sampler):
+    start = asyncio.Barrier(sessions + 1)
+    tasks = [
+        asyncio.create_task(_simulate(url, reruns, seed + number, timeout, start, latencies, errors))
+        for number in range(sessions)
+    ]
+    try:
+        await start.wait()
+    except asyncio.BrokenBarrierError:
+        await asyncio.gather(*tasks)  # re-raise the session's own error
+        raise
+    sampler.start()
+    began = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - began
+
+
+def run_level(script, sessions, reruns, seed=0, timeout=120):
+    """Drive ``sessions`` concurrent sessions of ``script`` for ``reruns`` reruns each."""
+    port = _free_port()
+    server = start_server(script, port)
+    latencies, errors = [], []
+    sampler = _RssSampler(server.pid)
+    try:
+        url = f"ws://localhost:{port}/_stcore/stream"
+        seconds = asyncio.run(_drive(url, sessions, reruns, seed, timeout, latencies, errors, sampler))
+    finally:
+        peak = sampler.stop() if sampler.is_alive() else sampler.peak
+        server.terminate()
+        server.wait()
+
+    return {
+        "sessions": sessions,
+        "reruns": len(latencies),
+        "errors": len(errors),
+        "error_messages": sorted(set(errors))[:10],
+        "seconds": seconds,
+        "throughput_per_second": len(latencies) / seconds if seconds else None,
+        "latency_seconds": {
+            f"p{percentile}": float(np.percentile(latencies, percentile)) if latencies else None
+            for percentile in PERCENTILES
+        },
+        "peak_rss_bytes": peak,
+    }
+
+
+def run_load_test(script, levels, reruns, seed=0, timeout=120):
+    return {
+        "script": script,
+        "dataset": os.environ.get("DASHBOARD_DATASET", "newbies.csv"),
+        "reruns_per_session": reruns,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "levels": [run_level(script, sessions, reruns, seed, timeout) for sessions in levels],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test a dashboard page with concurrent sessions.")
+    parser.add_argument("script", nargs="?", default="files.py")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--reruns", type=int, default=10, help="filter changes per session")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds allowed per rerun")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = run_load_test(args.script, args.concurrency, args.reruns, args.seed, args.timeout)
+    for level in report["levels"]:
+        latency = level["latency_seconds"]
+        rss = level["peak_rss_bytes"]
+        print(
+            f"{level['sessions']:>4} sessions: "
+            + " ".join(f"{name} {value * 1000:.0f} ms" for name, value in latency.items() if value is not None)
+            + f", {level['throughput_per_second']:.1f} reruns/s"
+            + (f", peak RSS {rss / 2**20:.0f} MiB" if rss is not None else "")
+            + (f", {level['errors']} errors" if level["errors"] else ""),
+            file=sys.stderr,
+        )
+
+    results = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(results + "\n")
+    else:
+        print(results)
@@ -0,0 +1,255 @@
+"""Partitioned, multi-wave survey datasets.
+
+Instead of concatenating every survey wave into one CSV, each wave is
+written into a directory of partitions keyed by wave and ``industry``::
+
+    waves/
+        _manifest.json
+        wave=2024-06/industry=Finance/part-<id>.csv
+        wave=2024-06/industry=Technology/part-<id>.csv
+        wave=2025-01/...
+
+Every partition is an ordinary survey CSV with an extra ``wave`` column.
+The manifest lists the partitions with their keys, row counts and column
+statistics (min/max of numeric columns, the distinct labels of the others),
+taken from the encoded answers so they use the dashboard labels.
+
+Pages pick waves with ``select`` and then ``prune`` the resulting
+``PartitionSet`` with the sidebar selection: partitions whose statistics
+rule out the selection are dropped using the manifest alone, so their files
+are never read. Pruning only drops partitions with no matching rows, so
+filtering the pruned set gives the same rows as filtering all of it.
+Plain CSV paths pass through every function unchanged.
+
+    python partitions.py survey_2024_06.csv waves --wave 2024-06
+"""
+import argparse
+import json
+import os
+import time
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+
+from survey_data import CATEGORY_RATIO, PartitionSet
+from survey_encoding import encode
+
+
+MANIFEST = "_manifest.json"
+WAVE = "wave"
+PARTITION_KEYS = (WAVE, "industry")
+MISSING = "_missing"  # directory name for rows without a key value
+STATS_MAX_VALUES = 1000  # label columns with more distinct values get no statistics
+
+_manifests = {}
+
+
+def is_partitioned(path):
+    return isinstance(path, PartitionSet) or os.path.isdir(path)
+
+
+def _directory(path):
+    return path.directory if isinstance(path, PartitionSet) else os.path.abspath(path)
+
+
+def manifest(path):
+    """Partition entries of the partitioned dataset at ``path``, re-read when the manifest changes."""
+    location = os.path.join(_directory(path), MANIFEST)
+    stat = os.stat(location)
+    stat_key = stat.st_mtime_ns, stat.st_size
+    cached = _manifests.get(location)
+    if cached is None or cached[0] != stat_key:
+        with open(location) as fh:
+            cached = _manifests[location] = (stat_key, json.load(fh)["partitions"])
+    return cached[1]
+
+
+def _partitions(path):
+    """Manifest entries of the files in ``path`` (a directory or ``PartitionSet``)."""
+    entries = manifest(path)
+    if not isinstance(path, PartitionSet):
+        return entries
+    files = set(path.files)
+    return [entry for entry in entries if os.path.join(path.directory, entry["path"]) in files]
+
+
+def _partition_set(directory, entries):
+    files = tuple(os.path.join(directory, entry["path"]) for entry in entries)
+    return PartitionSet(directory, files, _categorical(manifest(directory)))
+
+
+def _categorical(entries):
+    """Label columns of the whole dataset that one file of all its rows would categorise.
+
+    Taken from the statistics of every partition, so pruned sets agree on
+    the dtypes, and hence the label order, of their results.
+    """
+    rows = sum(entry["rows"] for entry in entries)
+    columns = [column for column in entries[0]["columns"]] if entries else []
+    categorical = []
+    for column in columns:
+        stats = [entry["columns"].get(column, {}) for entry in entries]
+        if all("values" in stat for stat in stats):
+            labels = set().union(*(stat["values"] for stat in stats))
+            if len(labels) <= CATEGORY_RATIO * rows:
+                categorical.append(column)
+    return tuple(categorical)
+
+
+def waves(path):
+    """Waves of a partitioned dataset in order; empty for a plain CSV."""
+    if not is_partitioned(path):
+        os.stat(path)  # a missing file fails here, like loading it would
+        return []
+    return sorted({entry["keys"][WAVE] for entry in manifest(path)})
+
+
+def select(path, waves=None):
+    """Partitions of the chosen ``waves`` (all of them if none are chosen)."""
+    if not is_partitioned(path):
+        return path
+    entries = manifest(path)
+    if waves:
+        entries = [entry for entry in entries if entry["keys"][WAVE] in set(waves)]
+    return _partition_set(_directory(path), entries)
+
+
+def options(path, column):
+    """Distinct values of ``column`` for the sidebar, from statistics for partitioned data."""
+    if not is_partitioned(path):
+        from filter_index import load_filter_index
+
+        return load_filter_index(path).options(column)
+    values = {}
+    for entry in _partitions(path):
+        values.update(dict.fromkeys(entry["columns"].get(column, {}).get("values", ())))
+    return list(values)
+
+
+def _may_match(stats, values):
+    """Whether a partition with column statistics ``stats`` can hold any of ``values``."""
+    if "values" in stats:
+        return not set(stats["values"]).isdisjoint(map(str, values))
+    if "min" in stats:
+        try:
+            return any(stats["min"] <= float(value) <= stats["max"] for value in values)
+        except (TypeError, ValueError):
+            return True
+    return True
+
+
+def prune(path, selections=None):
+    """``path`` without the partitions that ``selections`` rules out."""
+    if not isinstance(path, PartitionSet):
+        return path
+    entries = _partitions(path)
+    kept = [
+        entry for entry in entries
+        if all(
+            _may_match(entry["columns"][column], values)
+            for column, values in (selections or {}).items()
+            if values and column in entry["columns"]
+        )
+    ]
+    # An empty set has no columns; one partition filtered to no rows does.
+    return _partition_set(path.directory, kept or entries[:1])
+
+
+def _stats(column):
+    if pd.api.types.is_numeric_dtype(column):
+        present = column.dropna()
+        if present.empty:
+            return {}
+        return {"min": float(present.min()), "max": float(present.max())}
+    labels = column.dropna().astype(str).unique()
+    if len(labels) > STATS_MAX_VALUES:
+        return {}
+    return {"values": sorted(labels)}
+
+
+def _key_name(value):
+    return MISSING if pd.isna(value) else urllib.parse.quote(str(value), safe="")
+
+
+def write_wave(frame, directory, wave):
+    """Write the responses of ``wave`` as partitions of ``directory``, replacing that wave.
+
+    The new partitions get new file names and the old ones are deleted only
+    after the manifest is swapped, so pages still on the old manifest keep
+    reading complete files until they pick up the new one.
+    """
+    os.makedirs(directory, exist_ok=True)
+    location = os.path.join(directory, MANIFEST)
+    try:
+        with open(location) as fh:
+            entries = json.load(fh)["partitions"]
+    except FileNotFoundError:
+        entries = []
+    replaced = [entry for entry in entries if entry["keys"][WAVE] == wave]
+    entries = [entry for entry in entries if entry["keys"][WAVE] != wave]
+    # New files get new names, so readers of the old manifest keep theirs until it is replaced.
+    part_name = f"part-{time.time_ns():x}.csv"
+
+    frame = frame.assign(**{WAVE: wave})
+    encoded = encode(frame)  # statistics and keys use the dashboard labels
+    keys = [key for key in PARTITION_KEYS if key != WAVE]
+    for values, rows in encoded.groupby(keys, dropna=False, sort=True).indices.items():
+        values = values if isinstance(values, tuple) else (values,)
+        relative = os.path.join(
+            f"{WAVE}={_key_name(wave)}",
+            *(f"{key}={_key_name(value)}" for key, value in zip(keys, values)),
+            part_name,
+        )
+        os.makedirs(os.path.join(directory, os.path.dirname(relative)), exist_ok=True)
+        frame.iloc[rows].to_csv(os.path.join(directory, relative), index=False)
+        part = encoded.iloc[rows]
+        entries.append({
+            "path": relative,
+            "keys": {WAVE: wave, **{key: None if pd.isna(value) else str(value) for key, value in zip(keys, values)}},
+            "rows": len(rows),
+            "columns": {column: _stats(part[column]) for column in part.columns},
+        })
+
+    entries.sort(key=lambda entry: (entry["keys"][WAVE], entry["path"]))
+    tmp = location + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump({"keys": list(PARTITION_KEYS), "partitions": entries}, fh, indent=1, default=_json_default)
+    os.replace(tmp, location)  # readers see the old or the new manifest, never half of one
+    _remove_parts(directory, replaced)
+    return [entry for entry in entries if entry["keys"][WAVE] == wave]
+
+
+def _remove_parts(directory, entries):
+    """Delete the files of replaced partition ``entries`` and the directories they leave empty."""
+    for entry in entries:
+        location = os.path.join(directory, entry["path"])
+        for name in (location, os.path.splitext(location)[0] + ".arrow"):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+        parent = os.path.dirname(location)
+        while os.path.abspath(parent) != os.path.abspath(directory):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break  # still holds other partitions
+            parent = os.path.dirname(parent)
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot store {type(value).__name__} in the manifest")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add a survey wave to a partitioned dataset.")
+    parser.add_argument("csv", help="responses of one wave")
+    parser.add_argument("directory", help="partitioned dataset to write into")
+    parser.add_argument("--wave", required=True, help="wave label, e.g. 2024-06")
+    args = parser.parse_args()
+    written = write_wave(pd.read_csv(args.csv), args.directory, args.wave)
+    print(f"{args.csv}: {sum(entry['rows'] for entry in written)} rows in {len(written)} partitions "
+          f"-> {args.directory} (wave {args.wave})")
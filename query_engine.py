@@ -0,0 +1,209 @@
+"""Declarative dashboard specs evaluated in a single vectorised pass.
+
+A ``DashboardSpec`` lists every grouping (respondent counts by a set of
+columns) and metric (``nunique``/``count`` of a column) a page needs.
+``evaluate`` computes all of them together: each column is turned into
+integer codes once, the grouping columns are combined into one cell code
+and counted with a single ``bincount``, and every grouping is read off that
+small cell table.
+
+``run`` plans where to evaluate: parts of the spec that only touch count
+cube dimensions are evaluated over the cube cells matching the selection
+(weighted by their counts); anything else, such as ``nunique`` over ``id``,
+is evaluated over the filtered rows. Without a selection, ``nunique``
+metrics over ``DISTINCT_COLUMNS`` are read from their counters instead.
+Results are cached per selection.
+
+That plan is the ``pandas`` backend. The ``sqlite`` backend
+(``sql_backend.py``) pushes the same filters and aggregates down to an
+indexed SQLite table and returns identical results. ``DASHBOARD_QUERY_BACKEND``
+picks one; SQLite is the default. Partition sets always use the ``pandas``
+backend, whose cube and indexes are merged from the partitions' own.
+
+With ``approximate=True`` the unfiltered ``count``/``nunique`` metrics and
+one-column groupings are read from mergeable sketches (``sketches.py``)
+instead, and only the rest of the spec goes to the backend.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregate_cube import load_count_cube, load_distinct_values
+from filter_index import load_filter_index
+from instrumentation import stage
+from result_cache import cached
+from sketches import load_survey_sketches
+from sql_backend import load_sqlite_store
+from survey_data import DEFAULT_DATASET, PartitionSet, load_survey
+
+
+BACKENDS = ("sqlite", "pandas")
+BACKEND = os.environ.get("DASHBOARD_QUERY_BACKEND", "sqlite")
+
+
+class DashboardSpec:
+    def __init__(self, name, groupings=None, metrics=None):
+        self.name = name
+        self.groupings = {key: list(columns) for key, columns in (groupings or {}).items()}
+        self.metrics = dict(metrics or {})  # name -> (aggregate, column)
+
+    def columns(self):
+        columns = [column for by in self.groupings.values() for column in by]
+        columns += [column for _, column in self.metrics.values() if column is not None]
+        return list(dict.fromkeys(columns))
+
+    def subset(self, keep):
+        """Spec with only the groupings and metrics whose columns satisfy ``keep``.
+
+        ``keep`` is called with ``None`` for metrics without a column (``count``).
+        """
+        return DashboardSpec(
+            self.name,
+            {key: by for key, by in self.groupings.items() if all(keep(column) for column in by)},
+            {key: metric for key, metric in self.metrics.items() if keep(metric[1])},
+        )
+
+    def without(self, other):
+        """Spec with the groupings and metrics that ``other`` does not cover."""
+        return DashboardSpec(
+            self.name,
+            {key: by for key, by in self.groupings.items() if key not in other.groupings},
+            {key: metric for key, metric in self.metrics.items() if key not in other.metrics},
+        )
+
+
+def _codes(series):
+    """Codes shifted by one so that 0 means missing, plus the labels."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy().astype(np.int64) + 1, series.cat.categories
+    codes, labels = pd.factorize(series)
+    return codes.astype(np.int64) + 1, labels
+
+
+def evaluate(spec, frame, weights=None):
+    """Evaluate ``spec`` over the rows of ``frame`` in one pass.
+
+    ``weights`` gives a count per row (e.g. cube cells); groupings or
+    metrics over columns ``frame`` lacks are left out of the result.
+    """
+    spec = spec.subset(lambda column: column is None or column in frame.columns)
+    encoded = {column: _codes(frame[column]) for column in spec.columns()}
+    total = len(frame) if weights is None else int(np.sum(weights))
+    results = {}
+
+    for key, (aggregate, column) in spec.metrics.items():
+        if aggregate == "count":
+            results[key] = total
+        elif aggregate == "nunique":
+            codes, labels = encoded[column]
+            seen = np.bincount(codes, weights=weights, minlength=len(labels) + 1)
+            results[key] = int(np.count_nonzero(seen[1:]))
+        else:
+            raise ValueError(f"Unknown aggregate: {aggregate}")
+
+    dimensions = list(dict.fromkeys(column for by in spec.groupings.values() for column in by))
+    if not dimensions:
+        return results
+    sizes = [len(encoded[column][1]) + 1 for column in dimensions]
+    cells = np.ravel_multi_index([encoded[column][0] for column in dimensions], sizes)
+    if np.prod(sizes, dtype=float) <= max(4 * len(frame), 1 << 16):
+        counts = np.bincount(cells, weights=weights, minlength=int(np.prod(sizes)))
+        cells = np.flatnonzero(counts)
+        counts = counts[cells]
+    else:
+        cells, inverse = np.unique(cells, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights)
+    table = pd.DataFrame(dict(zip(dimensions, np.unravel_index(cells, sizes))))
+    table["count"] = counts.astype(np.int64)
+    table = table[table["count"] > 0]
+
+    for key, by in spec.groupings.items():
+        grouped = table[(table[by] > 0).all(axis=1)].groupby(by, sort=True)["count"].sum().reset_index()
+        for column in by:
+            labels = encoded[column][1]
+            grouped[column] = pd.Categorical.from_codes(grouped[column].to_numpy() - 1, categories=labels)
+        results[key] = grouped
+    return results
+
+
+def _compute_pandas(spec, selections, path):
+    cube = load_count_cube(path)
+    on_cube = spec.subset(lambda column: column is None or column in cube.dimensions)
+    on_rows = spec.without(on_cube)
+    filters_on_cube = all(column in cube.dimensions for column, values in (selections or {}).items() if values)
+
+    if not filters_on_cube:
+        on_cube, on_rows = DashboardSpec(spec.name), spec
+    results = {}
+    if on_cube.groupings or on_cube.metrics:
+        cells = cube.slice(selections)
+        results = evaluate(on_cube, cells, weights=cells["count"].to_numpy())
+    if on_rows.metrics and not any((selections or {}).values()):
+        distinct = load_distinct_values(path)
+        on_counters = DashboardSpec(spec.name, metrics={
+            key: (aggregate, column)
+            for key, (aggregate, column) in on_rows.metrics.items()
+            if aggregate == "nunique" and column in distinct.counts
+        })
+        results.update({key: distinct.nunique(column) for key, (_, column) in on_counters.metrics.items()})
+        on_rows = on_rows.without(on_counters)
+    if on_rows.groupings or on_rows.metrics:
+        base = load_survey(path, columns=on_rows.columns())
+        rows = load_filter_index(path).select(base, selections).frame()
+        results.update(evaluate(on_rows, rows))
+    return results
+
+
+def _sketch_spec(spec, sketches):
+    """The part of ``spec`` that ``sketches`` can answer."""
+    return DashboardSpec(
+        spec.name,
+        {key: by for key, by in spec.groupings.items() if len(by) == 1 and by[0] in sketches.frequencies},
+        {
+            key: (aggregate, column) for key, (aggregate, column) in spec.metrics.items()
+            if aggregate == "count" or (aggregate == "nunique" and column in sketches.distinct)
+        },
+    )
+
+
+def backend_for(path, backend=None):
+    """The backend that answers queries over ``path``: ``backend`` or the configured one, pandas for partition sets."""
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown query backend: {backend}")
+    return "pandas" if isinstance(path, PartitionSet) else backend
+
+
+def compute(spec, selections=None, path=DEFAULT_DATASET, backend=None, approximate=False):
+    """Evaluate ``spec`` for a sidebar selection without caching.
+
+    ``approximate`` answers what it can of an unfiltered spec from sketches.
+    """
+    backend = backend_for(path, backend)
+    selections = selections or {}
+    with stage(f"query/{spec.name}"):
+        results = {}
+        if approximate and not any((selections or {}).values()):
+            sketches = load_survey_sketches(path)
+            on_sketches = _sketch_spec(spec, sketches)
+            results = sketches.evaluate(on_sketches)
+            spec = spec.without(on_sketches)
+            if not spec.groupings and not spec.metrics:
+                return results
+        if backend == "sqlite":
+            results.update(load_sqlite_store(path).evaluate(spec, selections, load_filter_index(path).text))
+        else:
+            results.update(_compute_pandas(spec, selections, path))
+        return results
+
+
+def run(spec, selections=None, path=DEFAULT_DATASET, approximate=False, backend=None):
+    """Results of ``spec`` for a sidebar selection, cached per data version.
+
+    ``backend`` overrides ``DASHBOARD_QUERY_BACKEND``; its results are cached apart.
+    """
+    name = f"query/{spec.name}/approximate" if approximate else f"query/{spec.name}"
+    if backend and backend != BACKEND:
+        name += f"/{backend}"
+    return cached(name, selections, lambda: compute(spec, selections, path, backend, approximate), path)
@@ -0,0 +1,82 @@
+"""Process-wide LRU cache of per-selection dashboard results.
+
+Many sessions look at the same few filter combinations. Results computed
+for a view (aggregated counts, serialised figure JSON) are stored under the
+data version, the view name and the canonical sidebar selection, so popular
+views skip pandas and plotly express entirely. The cache holds at most
+``DASHBOARD_RESULT_CACHE_SIZE`` entries (default 256), evicting the least
+recently used. When a data file is reloaded, ``discard_versions`` drops the
+results of the replaced version from every cache at once.
+"""
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+from survey_data import DEFAULT_DATASET, data_version
+
+
+_caches = weakref.WeakSet()
+
+
+class ResultCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._items:
+                self.hits += 1
+                self._items.move_to_end(key)
+                return self._items[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def discard(self, versions):
+        """Drop the entries cached for any of the data ``versions``."""
+        versions = set(versions)
+        with self._lock:
+            for key in [key for key in self._items if key[0] in versions]:
+                del self._items[key]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._items), "maxsize": self.maxsize}
+
+
+def selection_key(selections):
+    """Canonical, hashable form of ``{column: values}``; empty selections drop out."""
+    return tuple(
+        (column, tuple(sorted(map(str, values))))
+        for column, values in sorted((selections or {}).items())
+        if values
+    )
+
+
+def discard_versions(versions):
+    """Drop the results of data ``versions`` from every result cache."""
+    for cache in list(_caches):
+        cache.discard(versions)
+
+
+results = ResultCache(int(os.environ.get("DASHBOARD_RESULT_CACHE_SIZE", 256)))
+
+
+def cached(name, selections, compute, path=DEFAULT_DATASET, cache=None):
+    """Return ``compute()`` for view ``name``, reusing earlier results for the same data and selection."""
+    key = (data_version(path), name, selection_key(selections))
+    return (results if cache is None else cache).get_or_compute(key, compute)
@@ -0,0 +1,193 @@
+"""Mergeable sketches for approximate dashboard KPIs.
+
+``SurveySketches`` summarises the survey in constant memory: a HyperLogLog
+per KPI column for its distinct count and a count-min sketch per pie-chart
+column for its category frequencies. A sketch is built per block of rows
+(the loaded file, then every appended batch) and blocks are merged, so the
+summary never needs the rows again. Each file of a partitioned survey
+carries its own sketches, and a set of partitions merges them.
+
+In approximate mode (``DASHBOARD_APPROXIMATE=1`` or the sidebar toggle)
+``query_engine`` answers the unfiltered KPIs and pie charts from the
+sketches. They summarise the whole survey, so any sidebar selection falls
+back to the exact path. The error bounds are:
+
+* HyperLogLog: relative standard error ``1.04 / sqrt(2 ** HLL_PRECISION)``
+  (0.8% by default).
+* Count-min: never under the true count, and over it by at most
+  ``e / CMS_WIDTH`` of all responses with probability ``1 - e ** -CMS_DEPTH``.
+"""
+import copy
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from survey_data import DEFAULT_DATASET, PartitionSet, derived, merged_parts
+
+
+APPROXIMATE = os.environ.get("DASHBOARD_APPROXIMATE", "").strip().lower() in ("1", "true", "yes", "on")
+
+SKETCH_DISTINCT = ("id", "industry", "tools")
+SKETCH_FREQUENCIES = ("experience", "motivation", "satisfaction")
+
+HLL_PRECISION = int(os.environ.get("DASHBOARD_HLL_PRECISION", 14))
+CMS_WIDTH = int(os.environ.get("DASHBOARD_CMS_WIDTH", 2048))
+CMS_DEPTH = int(os.environ.get("DASHBOARD_CMS_DEPTH", 5))
+
+
+def _hashes(series):
+    """64-bit hashes of the non-missing values of ``series`` and their counts."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Hash each label once; the same label hashes alike in every block.
+        codes = series.cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+        keep = counts > 0
+        return pd.util.hash_array(series.cat.categories.to_numpy()[keep]), counts[keep]
+    values = series.dropna().to_numpy()
+    return pd.util.hash_array(values), np.ones(len(values), dtype=np.int64)
+
+
+def _bit_length(values):
+    """``int.bit_length`` of each uint64 in ``values``."""
+    high, low = values >> np.uint64(32), values & np.uint64(0xFFFFFFFF)
+    # Each 32-bit half is exact as a float, so frexp gives its bit length.
+    return np.where(high > 0, 32 + np.frexp(high.astype(float))[1], np.frexp(low.astype(float))[1])
+
+
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes):
+        bits = 64 - self.precision
+        buckets = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        ranks = (bits + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def merged(self, other):
+        sketch = copy.copy(self)
+        sketch.registers = np.maximum(self.registers, other.registers)
+        return sketch
+
+    @property
+    def relative_error(self):
+        """Relative standard error of ``estimate``."""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))  # linear counting for small counts
+        return round(raw)
+
+
+class CountMinSketch:
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH):
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def _columns(self, hashes):
+        depth, width = self.table.shape
+        # Row i uses h1 + i * h2, two halves of one 64-bit hash.
+        first, second = hashes & np.uint64(0xFFFFFFFF), hashes >> np.uint64(32)
+        return [((first + np.uint64(row) * second) % np.uint64(width)).astype(np.int64) for row in range(depth)]
+
+    def add(self, hashes, counts):
+        for row, columns in enumerate(self._columns(hashes)):
+            np.add.at(self.table[row], columns, counts)
+        self.total += int(np.sum(counts))
+
+    def merged(self, other):
+        sketch = copy.copy(self)
+        sketch.table = self.table + other.table
+        sketch.total = self.total + other.total
+        return sketch
+
+    @property
+    def error(self):
+        """Largest overcount of any estimate with probability ``confidence``."""
+        return math.e / self.table.shape[1] * self.total
+
+    @property
+    def confidence(self):
+        return 1 - math.exp(-self.table.shape[0])
+
+    def estimate(self, hashes):
+        return np.min([self.table[row, columns] for row, columns in enumerate(self._columns(hashes))], axis=0)
+
+
+class SurveySketches:
+    def __init__(self, frame, distinct=SKETCH_DISTINCT, frequencies=SKETCH_FREQUENCIES):
+        self.rows = len(frame)
+        self.distinct = {}
+        for column in distinct:
+            if column in frame.columns:
+                self.distinct[column] = HyperLogLog()
+                self.distinct[column].add(_hashes(frame[column])[0])
+        self.frequencies = {}
+        self.labels = {}  # column -> labels seen, for reading the sketch back
+        for column in frequencies:
+            if column in frame.columns:
+                self.frequencies[column] = CountMinSketch()
+                self.frequencies[column].add(*_hashes(frame[column]))
+                self.labels[column] = set(frame[column].dropna().unique())
+
+    def merged(self, other):
+        """Sketches of the rows of both ``self`` and ``other``."""
+        sketches = copy.copy(self)
+        sketches.rows = self.rows + other.rows
+        sketches.distinct = {column: hll.merged(other.distinct[column]) for column, hll in self.distinct.items()}
+        sketches.frequencies = {
+            column: cms.merged(other.frequencies[column]) for column, cms in self.frequencies.items()
+        }
+        sketches.labels = {column: labels | other.labels[column] for column, labels in self.labels.items()}
+        return sketches
+
+    def appended(self, batch):
+        return self.merged(SurveySketches(batch, self.distinct, self.frequencies))
+
+    def nunique(self, column):
+        return self.distinct[column].estimate()
+
+    def value_counts(self, column):
+        """Estimated respondents per label, shaped like a one-column grouping."""
+        labels = pd.Index(sorted(self.labels[column]), dtype=object)
+        counts = self.frequencies[column].estimate(pd.util.hash_array(labels.to_numpy()))
+        keep = counts > 0
+        return pd.DataFrame({
+            column: pd.Categorical(labels[keep], categories=labels),
+            "count": counts[keep].astype(np.int64),
+        })
+
+    def evaluate(self, spec):
+        """Approximate results of ``spec``.
+
+        Only ``count``, ``nunique`` over ``distinct`` columns and single-column
+        groupings over ``frequencies`` columns can be answered.
+        """
+        results = {}
+        for key, (aggregate, column) in spec.metrics.items():
+            results[key] = self.rows if aggregate == "count" else self.nunique(column)
+        for key, (column,) in spec.groupings.items():
+            results[key] = self.value_counts(column)
+        return results
+
+    def errors(self):
+        """Error bounds for the UI: HyperLogLog relative error and count-min (overcount, confidence)."""
+        cms = next(iter(self.frequencies.values()), CountMinSketch())
+        hll = next(iter(self.distinct.values()), HyperLogLog())
+        return {"relative": hll.relative_error, "overcount": cms.error, "confidence": cms.confidence}
+
+
+def load_survey_sketches(path=DEFAULT_DATASET):
+    """KPI sketches for the current version of ``path``."""
+    if isinstance(path, PartitionSet):
+        return merged_parts("survey_sketches", load_survey_sketches, SurveySketches.merged, path)
+    return derived("survey_sketches", SurveySketches, path, columns=[*SKETCH_DISTINCT, *SKETCH_FREQUENCIES])
@@ -0,0 +1,256 @@
+"""SQLite query backend for ``query_engine``.
+
+The survey is copied into an SQLite table with an index on every sidebar
+filter column. A ``DashboardSpec`` is then answered inside SQLite: the
+sidebar selection becomes ``IN`` clauses, the categorical groupings share
+one ``GROUP BY`` over all of their columns (the small cell table is
+marginalised in pandas) and the metrics are a single ``COUNT`` /
+``COUNT(DISTINCT ...)`` query, so only aggregated rows come back to
+pandas. Keyword searches are answered by the in-memory ``TextIndex`` and
+passed to SQLite as the matching row positions. Results are identical to
+the pandas backend, down to the categorical labels and row order.
+
+There is one database file per data version in ``DASHBOARD_SQLITE_DIR``
+(a private ``dashboard-<uid>`` directory in the system temp directory by
+default; like the shared columnar copies, it must belong to the current
+user and only files owned by the user are opened). The first process to need it
+builds it and publishes it atomically; every process, including later
+ones, opens it read-only. Files nobody opened for
+``DASHBOARD_SHARED_MAX_AGE`` seconds are removed when a new one is
+published. Appended responses go to a temporary table of the connection
+and are queried together with the published rows. A store only reads the
+rows that existed when it was made, so results stay tied to their data
+version.
+
+The store is built from the loaded survey and the filter and text indexes
+stay in memory, so this backend moves aggregation into SQLite, not the data
+out of RAM.
+"""
+import copy
+import json
+import os
+import pathlib
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from filter_index import FILTER_COLUMNS
+from survey_data import DEFAULT_DATASET, SHARED_MAX_AGE, USER_ID, derived, file_lock, owned, private_directory
+from text_index import SEARCH
+
+
+SQLITE_DIR = os.environ.get("DASHBOARD_SQLITE_DIR") or os.path.join(tempfile.gettempdir(), f"dashboard-{USER_ID}")
+TABLE = "survey"
+ROWS_VIEW = "temp.survey_rows"  # published rows followed by appended ones
+INSERT_ROWS = 50_000
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _param(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _write(location, frame, indexed):
+    """Write ``frame`` and its indexes to a new database file at ``location``."""
+    connection = sqlite3.connect(location)
+    try:
+        # A half-written file is discarded, so it needs no journal.
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        for start in range(0, max(len(frame), 1), INSERT_ROWS):
+            chunk = frame.iloc[start:start + INSERT_ROWS]
+            chunk.to_sql(TABLE, connection, if_exists="append", index=False)
+        for column in indexed:
+            if column in frame.columns:
+                connection.execute(f"CREATE INDEX {_quote(f'{TABLE}_{column}')} ON {TABLE} ({_quote(column)})")
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def _database_file(version, frame, indexed):
+    """Location of the database of data version ``version``, published if needed."""
+    directory = private_directory(SQLITE_DIR)
+    location = os.path.join(directory, f"survey-{version[:20]}.sqlite")
+    if not owned(location):
+        with file_lock(location + ".lock"):
+            # One process builds; the others wait and then open it.
+            if not owned(location):
+                fd, tmp = tempfile.mkstemp(dir=directory, prefix="survey-", suffix=".sqlite.tmp")
+                os.close(fd)
+                try:
+                    _write(tmp, frame, indexed)
+                    os.replace(tmp, location)
+                finally:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+                clean()
+    os.utime(location)  # in use: keep it from clean
+    return location
+
+
+def clean(max_age=None):
+    """Remove database files that no process opened for ``max_age`` seconds."""
+    max_age = SHARED_MAX_AGE if max_age is None else max_age
+    now = time.time()
+    for name in os.listdir(SQLITE_DIR):
+        if not name.startswith("survey-") or not name.endswith((".sqlite", ".sqlite.tmp")):
+            continue
+        location = os.path.join(SQLITE_DIR, name)
+        try:
+            if now - os.stat(location).st_mtime > max_age:
+                # Open connections keep reading a removed file.
+                os.remove(location)
+                if os.path.exists(location + ".lock"):
+                    os.remove(location + ".lock")
+        except OSError:
+            continue
+
+
+class _Database:
+    def __init__(self, location, rows):
+        # Published files never change, so readers need no locking.
+        uri = f"{pathlib.Path(location).as_uri()}?mode=ro&immutable=1"
+        self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self.rows = rows  # rows in the published table
+        self.appended = False
+        self.lock = threading.Lock()
+        weakref.finalize(self, self.connection.close)
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def append(self, frame):
+        """Add the rows of ``frame`` after every row so far, for this connection only."""
+        with self.lock:
+            if not self.appended:
+                self.connection.execute(f"CREATE TEMP TABLE appended AS SELECT * FROM main.{TABLE} WHERE 0")
+                self.connection.execute(
+                    f"CREATE TEMP VIEW survey_rows AS SELECT rowid AS position, * FROM main.{TABLE} "
+                    f"UNION ALL SELECT rowid + {self.rows}, * FROM temp.appended"
+                )
+                self.appended = True
+            columns = ", ".join(map(_quote, frame.columns))
+            values = frame.astype(object).where(frame.notna(), None)
+            self.connection.executemany(
+                f"INSERT INTO temp.appended ({columns}) VALUES ({', '.join('?' * len(frame.columns))})",
+                values.itertuples(index=False, name=None),
+            )
+            self.connection.commit()
+
+
+class SqliteStore:
+    def __init__(self, frame, version, indexed=FILTER_COLUMNS):
+        self.database = _Database(_database_file(version, frame, indexed), len(frame))
+        self.dtypes = dict(frame.dtypes)
+        self.rows = len(frame)
+        self.relation, self.position = TABLE, "rowid"
+
+    def appended(self, batch):
+        """Store that also sees the rows of ``batch``."""
+        store = copy.copy(self)
+        store.dtypes = dict(self.dtypes)
+        for column, dtype in self.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                labels = set(dtype.categories).union(batch[column].dropna())
+                store.dtypes[column] = pd.CategoricalDtype(sorted(labels))
+        self.database.append(batch[list(self.dtypes)])
+        store.rows = self.rows + len(batch)
+        store.relation, store.position = ROWS_VIEW, "position"
+        return store
+
+    def _where(self, selections, text=None):
+        clauses, params = [f"{self.position} <= ?"], [self.rows]
+        for column, values in (selections or {}).items():
+            if values and column in self.dtypes:
+                clauses.append(f"{_quote(column)} IN ({', '.join('?' * len(values))})")
+                params += [_param(value) for value in values]
+        matched = text.mask((selections or {}).get(SEARCH) or ()) if text is not None else None
+        if matched is not None:
+            # Rows are inserted in order, so row position n has rowid (or position) n + 1.
+            clauses.append(f"{self.position} IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps((np.flatnonzero(matched) + 1).tolist()))
+        return clauses, params
+
+    def _labels(self, column, clauses, params):
+        """Labels of ``column`` as the pandas backend would encode them."""
+        dtype = self.dtypes[column]
+        if isinstance(dtype, pd.CategoricalDtype):
+            return dtype.categories
+        # Uncategorised columns are factorized in order of first appearance.
+        rows = self.database.query(
+            f"SELECT {_quote(column)} FROM {self.relation} WHERE {' AND '.join(clauses)} "
+            f"AND {_quote(column)} IS NOT NULL GROUP BY {_quote(column)} ORDER BY MIN({self.position})",
+            params,
+        )
+        return pd.Index([row[0] for row in rows], dtype=dtype)
+
+    def evaluate(self, spec, selections=None, text=None):
+        """Evaluate ``spec`` over the rows matching ``selections``, like ``query_engine.evaluate``.
+
+        ``text`` is the ``TextIndex`` of the same data version, used for keyword searches.
+        """
+        spec = spec.subset(lambda column: column is None or column in self.dtypes)
+        clauses, params = self._where(selections, text)
+        where = " AND ".join(clauses)
+        results = {}
+
+        if spec.metrics:
+            expressions = []
+            for aggregate, column in spec.metrics.values():
+                if aggregate == "count":
+                    expressions.append("COUNT(*)")
+                elif aggregate == "nunique":
+                    expressions.append(f"COUNT(DISTINCT {_quote(column)})")
+                else:
+                    raise ValueError(f"Unknown aggregate: {aggregate}")
+            values = self.database.query(f"SELECT {', '.join(expressions)} FROM {self.relation} WHERE {where}", params)[0]
+            results.update(zip(spec.metrics, map(int, values)))
+
+        categorical = {
+            key: by for key, by in spec.groupings.items()
+            if all(isinstance(self.dtypes[column], pd.CategoricalDtype) for column in by)
+        }
+        if categorical:
+            dimensions = list(dict.fromkeys(column for by in categorical.values() for column in by))
+            columns = ", ".join(map(_quote, dimensions))
+            rows = self.database.query(
+                f"SELECT {columns}, COUNT(*) FROM {self.relation} WHERE {where} GROUP BY {columns}",
+                params,
+            )
+            cells = pd.DataFrame(rows, columns=[*dimensions, "count"])
+            for column in dimensions:
+                cells[column] = pd.Categorical(cells[column], categories=self.dtypes[column].categories)
+            cells["count"] = cells["count"].astype(np.int64)
+            for key, by in categorical.items():
+                results[key] = cells.groupby(by, observed=True, sort=True)["count"].sum().reset_index()
+
+        for key, by in spec.groupings.items():
+            if key in categorical:
+                continue
+            columns = ", ".join(map(_quote, by))
+            present = " AND ".join(f"{_quote(column)} IS NOT NULL" for column in by)
+            rows = self.database.query(
+                f"SELECT {columns}, COUNT(*) FROM {self.relation} WHERE {where} AND {present} GROUP BY {columns}",
+                params,
+            )
+            grouped = pd.DataFrame(rows, columns=[*by, "count"])
+            for column in by:
+                grouped[column] = pd.Categorical(grouped[column], categories=self._labels(column, clauses, params))
+            grouped["count"] = grouped["count"].astype(np.int64)
+            results[key] = grouped.sort_values(by).reset_index(drop=True)
+        return results
+
+
+def load_sqlite_store(path=DEFAULT_DATASET):
+    """SQLite copy of the current version of ``path``."""
+    return derived("sqlite_store", SqliteStore, path, versioned=True)
@@ -0,0 +1,268 @@
+"""Offline static report: pre-rendered dashboard views for a plain file server.
+
+Many readers only ever look at a fixed set of views, such as each industry
+or each tool. This CLI renders those views ahead of time with the same
+query and figure code as ``files.py``, so they can be served as static
+files without a Python process behind them.
+
+The views form a lattice of sidebar selections. There is always the
+unfiltered survey. Each ``--by`` entry then adds one view per value of a
+filter column (``industry``), or one per combination of values of several
+columns (``industry,education``). Combinations without responses are
+skipped.
+
+Views are rendered by a process pool with one worker per core. The survey,
+its filter index, count cube and distinct counters are built before the
+pool starts, and views are queried with the ``pandas`` backend over them,
+so forked workers share them instead of parsing the data again and never
+build or open a SQLite database of their own. For every view the report
+has:
+
+* ``<view>.html``: the KPIs and every figure, using the ``plotly.min.js``
+  in the same directory.
+* ``<view>.json``: the selection, the KPIs and the plotly JSON of every
+  figure.
+
+``index.html`` links every view with its respondent count, and
+``index.json`` lists the same for scripts.
+
+    python static_report.py --output report
+    python static_report.py waves/ --waves 2025-01 --by industry tools industry,education
+"""
+import argparse
+import concurrent.futures
+import datetime
+import functools
+import html
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import time
+import warnings
+
+from plotly.offline import get_plotlyjs
+
+import charts
+import partitions
+import query_engine
+from aggregate_cube import load_count_cube, load_distinct_values
+from filter_index import FILTER_COLUMNS, load_filter_index
+from survey_data import DEFAULT_DATASET, load_survey
+
+
+DEFAULT_BY = ("industry", "tools")
+QUERY_BACKEND = "pandas"  # answers from the structures the workers inherit
+
+KPI_LABELS = {
+    "num_respondents": "Number of Respondents",
+    "num_industry": "Number of Industry",
+    "num_tools": "Number of Tools",
+}
+
+# Figure order on a page, as on files.py
+PAGE_FIGURES = (*charts.FIGURES, "scatter", *(f"top_terms/{column}" for column in charts.TEXT_LABELS))
+
+warnings.filterwarnings("ignore")
+
+
+def _slug(selections):
+    if not selections:
+        return "all"
+    text = "__".join(f"{column}-{values[0]}" for column, values in selections.items())
+    return re.sub(r"[^a-z0-9_]+", "-", text.lower()).strip("-")
+
+
+def _title(selections):
+    if not selections:
+        return "All responses"
+    return ", ".join(f"{column.capitalize()}: {values[0]}" for column, values in selections.items())
+
+
+def views(survey, by=DEFAULT_BY):
+    """``(slug, title, selections)`` of every view the report renders, unfiltered first.
+
+    ``by`` holds column names, or comma-separated names for combinations.
+    Combinations without responses are left out.
+    """
+    options = {column: partitions.options(survey, column) for column in FILTER_COLUMNS}
+    filter_index = load_filter_index(survey)
+    lattice = [{}]
+    for entry in by:
+        columns = [column.strip() for column in entry.split(",") if column.strip()]
+        unknown = [column for column in columns if column not in FILTER_COLUMNS]
+        if unknown:
+            raise ValueError(f"Cannot group the report by {', '.join(unknown)}; choose from {', '.join(FILTER_COLUMNS)}")
+        for values in itertools.product(*(options[column] for column in columns)):
+            lattice.append({column: [value] for column, value in zip(columns, values)})
+
+    found, seen, slugs = [], set(), set()
+    for selections in lattice:
+        key = tuple(sorted((column, values[0]) for column, values in selections.items()))
+        if key in seen:  # the same view from another --by entry
+            continue
+        seen.add(key)
+        mask = filter_index.mask(selections)
+        if mask is not None and not mask.any():
+            continue
+        slug = base = _slug(selections)
+        number = 1
+        while slug in slugs:  # labels that differ only in punctuation or case
+            number += 1
+            slug = f"{base}-{number}"
+        slugs.add(slug)
+        found.append((slug, _title(selections), selections))
+    return found
+
+
+def _figures(survey, selections):
+    """Plotly JSON of the figures of one view, built like the dashboard sections build them."""
+    dataset = partitions.prune(survey, selections)
+    results = query_engine.run(charts.DASHBOARD_SPEC, selections, dataset, backend=QUERY_BACKEND)
+    # Top terms only need the row positions; the scatter plot its two columns.
+    filtered = load_filter_index(dataset).select(load_survey(dataset, columns=charts.SCATTER_COLUMNS), selections)
+    figures = {name: charts.chart(name, results, selections, dataset, as_json=True) for name in charts.FIGURES}
+    figures["scatter"] = charts.scatter(filtered, selections, dataset, as_json=True)
+    for column in charts.TEXT_LABELS:
+        figures[f"top_terms/{column}"] = charts.top_terms(filtered, column, selections, dataset, as_json=True)
+    kpis = {key: int(results[key]) for key in KPI_LABELS}
+    return kpis, len(filtered), figures
+
+
+def _page(title, kpis, figures, generated):
+    kpi_cells = "".join(
+        f'<div class="kpi"><div class="label">{html.escape(label)}</div><div class="value">{kpis[key]:,}</div></div>'
+        for key, label in KPI_LABELS.items()
+    )
+    # The cached figure JSON is drawn as is; building plotly figures again would dominate the run.
+    charts_html = "".join(
+        f'<div class="chart" id="chart-{number}"></div><script>'
+        f'var figure = {_script_json(figures[name])};'
+        f'Plotly.newPlot("chart-{number}", figure.data, figure.layout, {{responsive: true}});</script>'
+        for number, name in enumerate(PAGE_FIGURES)
+    )
+    return _document(
+        f"{title} - Data Analyst Dashboard",
+        f'<p><a href="index.html">All views</a></p><h1>{html.escape(title)}</h1>'
+        f'<div class="kpis">{kpi_cells}</div><div class="charts">{charts_html}</div>'
+        f'<p class="generated">Generated {html.escape(generated)}</p>',
+    )
+
+
+def _script_json(text):
+    """JSON that cannot end the ``<script>`` element it is embedded in."""
+    return text.replace("</", "<\\/")
+
+
+def _document(title, body):
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<script src="plotly.min.js"></script>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+.kpis {{ display: flex; gap: 2em; }}
+.kpi .value {{ font-size: 2em; font-weight: bold; }}
+.charts {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(560px, 1fr)); gap: 1em; }}
+.generated {{ color: #666; }}
+td, th {{ padding: 0.2em 1em 0.2em 0; text-align: left; }}
+</style>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+
+def render_view(survey, output, generated, view):
+    """Write the HTML page and JSON of one view; returns its index entry."""
+    slug, title, selections = view
+    started = time.perf_counter()
+    kpis, rows, figures = _figures(survey, selections)
+    with open(os.path.join(output, f"{slug}.html"), "w", encoding="utf-8") as fh:
+        fh.write(_page(title, kpis, figures, generated))
+    header = json.dumps({"title": title, "selections": selections, "kpis": kpis})
+    with open(os.path.join(output, f"{slug}.json"), "w", encoding="utf-8") as fh:
+        # Figures are written as the cached JSON text rather than parsed and dumped again.
+        fh.write(header[:-1] + ', "figures": {')
+        fh.write(", ".join(f"{json.dumps(name)}: {figure}" for name, figure in figures.items()))
+        fh.write("}}")
+    return {
+        "slug": slug,
+        "title": title,
+        "selections": selections,
+        "rows": rows,
+        "kpis": kpis,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def _index(dataset, entries, generated):
+    rows = "".join(
+        f'<tr><td><a href="{entry["slug"]}.html">{html.escape(entry["title"])}</a></td>'
+        f'<td>{entry["rows"]:,}</td><td><a href="{entry["slug"]}.json">JSON</a></td></tr>'
+        for entry in entries
+    )
+    return _document(
+        "Data Analyst Dashboard - Static Report",
+        f"<h1>Data Analyst Dashboard</h1><p>{html.escape(str(dataset))}, generated {html.escape(generated)}</p>"
+        f"<table><tr><th>View</th><th>Responses</th><th></th></tr>{rows}</table>",
+    )
+
+
+def _pool(jobs):
+    # Forked workers start with the parent's loaded survey and indexes.
+    context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    return concurrent.futures.ProcessPoolExecutor(jobs, mp_context=context)
+
+
+def build_report(path=DEFAULT_DATASET, output="report", by=DEFAULT_BY, waves=None, jobs=None):
+    """Render every view of the report into ``output``; returns the index entries."""
+    survey = partitions.select(path, waves)
+    # Built once here; forked workers inherit them.
+    load_survey(survey)
+    load_count_cube(survey)
+    load_distinct_values(survey)
+    report_views = views(survey, by)
+    os.makedirs(output, exist_ok=True)
+    with open(os.path.join(output, "plotly.min.js"), "w", encoding="utf-8") as fh:
+        fh.write(get_plotlyjs())
+
+    generated = datetime.datetime.now().isoformat(timespec="seconds")
+    render = functools.partial(render_view, survey, output, generated)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        entries = list(map(render, report_views))
+    else:
+        with _pool(jobs) as pool:
+            entries = list(pool.map(render, report_views, chunksize=max(1, len(report_views) // (jobs * 4))))
+
+    with open(os.path.join(output, "index.html"), "w", encoding="utf-8") as fh:
+        fh.write(_index(path, entries, generated))
+    with open(os.path.join(output, "index.json"), "w", encoding="utf-8") as fh:
+        json.dump({"dataset": str(path), "waves": waves or [], "generated": generated, "views": entries}, fh, indent=1)
+    return entries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render dashboard views to static HTML and JSON.")
+    parser.add_argument("dataset", nargs="?", default=os.environ.get("DASHBOARD_DATASET", DEFAULT_DATASET))
+    parser.add_argument("--output", default="report", help="directory to write the report into")
+    parser.add_argument(
+        "--by", nargs="+", default=list(DEFAULT_BY),
+        help="filter columns to render one view per value of; join columns with ',' for combinations",
+    )
+    parser.add_argument("--waves", nargs="+", help="waves of a partitioned dataset (default: all)")
+    parser.add_argument("--jobs", type=int, help="worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        entries = build_report(args.dataset, args.output, args.by, args.waves, args.jobs)
+    except (FileNotFoundError, ValueError) as e:
+        parser.error(str(e))
+    print(f"{args.dataset}: {len(entries)} views -> {args.output}/index.html in {time.perf_counter() - started:.1f} s")
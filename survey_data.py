@@ -0,0 +1,681 @@
+"""Shared loader for the Datahub newbies survey.
+
+All dashboard scripts read the survey through ``load_survey`` so the data is
+parsed once per process instead of once per Streamlit rerun. The parsed
+columns are cached under their file path and re-read only when the file
+changes. Normalised labels and the ``*_numeric`` scores are derived while
+parsing (``survey_encoding.py``), so only the raw answers are stored.
+
+The survey can also be stored as an uncompressed Arrow IPC (Feather v2) file
+with dictionary-encoded columns (``python survey_data.py newbies.csv``).
+When an up-to-date ``.arrow`` file sits next to the requested CSV it is
+memory-mapped instead, and only the columns a page asks for are converted.
+A copy records the size and modification time its CSV had when it was
+read, and is up to date only while the CSV still has them. The CSV remains
+the fallback.
+
+Columns of a memory-mapped file are exposed to pandas without copying
+(numeric arrays and categorical codes point straight into the mapping), so
+every process that maps the same file shares one copy of the data in the
+OS page cache. Without a sibling ``.arrow`` file, the first process to load
+a CSV publishes a columnar copy to ``DASHBOARD_SHARED_DIR`` (a
+``dashboard-<uid>`` directory in ``/dev/shm`` by default, set it empty to
+disable) and every co-located worker attaches to that copy read-only. The
+directory must belong to the current user and be writable by no one else
+(a missing one is created with mode 0700), and only copies owned by the
+user are attached, so other local users cannot plant survey data. Publishing a copy removes the shared copies whose CSV
+is gone or has changed, and those no process has attached to for
+``DASHBOARD_SHARED_MAX_AGE`` seconds (a day by default).
+
+A survey run in waves can be stored as a directory of partitions
+(``partitions.py``). A ``PartitionSet`` names some of its partition files;
+each file is loaded and cached like any other survey, and the set is their
+concatenation, joined per column on first use. Structures derived from a
+set are merged from those of its files (``merged_parts``), so a selection
+that prunes to another set only joins the columns it asks for.
+
+New responses are appended with ``append_rows`` (see ``ingest.py``): the
+rows are added to the CSV and to the loaded survey, and derived structures
+that know how to take a batch are brought up to date from it instead of
+being rebuilt. Other processes that loaded the CSV notice that it only grew
+(its first bytes still hash the same) and parse just the new lines, with
+the same updates.
+
+``refresh`` loads a changed file ahead of the next request and rebuilds the
+structures derived from its previous version (``data_watcher.py`` calls it
+from a background file watcher).
+"""
+import argparse
+import collections
+import contextlib
+import copy
+import functools
+import hashlib
+import io
+import os
+import stat
+import tempfile
+import threading
+import time
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from instrumentation import profiled, stage
+from survey_encoding import encode
+
+
+DEFAULT_DATASET = "newbies.csv"
+ARROW_SUFFIX = ".arrow"
+USER_ID = os.getuid() if hasattr(os, "getuid") else None
+SHARED_DIR = os.environ.get(
+    "DASHBOARD_SHARED_DIR", f"/dev/shm/dashboard-{USER_ID}" if os.path.isdir("/dev/shm") else ""
+)
+SHARED_MAX_AGE = float(os.environ.get("DASHBOARD_SHARED_MAX_AGE", 24 * 3600))  # seconds unused before removal
+CATEGORY_RATIO = 0.5  # label columns with at most this share of distinct values are categorical
+PARTITION_SETS = int(os.environ.get("DASHBOARD_PARTITION_SETS", 16))  # loaded sets kept per process
+
+# Sessions get shallow copies of the cached columns; copy-on-write keeps any
+# edit a script makes to its copy from leaking into the shared data.
+pd.set_option("mode.copy_on_write", True)
+
+# Arrow schema metadata naming the CSV a columnar copy was made from
+SOURCE_PATH = b"dashboard.source_path"
+SOURCE_STAT = b"dashboard.source_stat"
+SOURCE_SHA1 = b"dashboard.source_sha1"
+
+_entries = {}
+_copy_sources = {}  # columnar copy -> (its stat key, recorded source path and stat key)
+_current = {}  # requested path -> entry it last resolved to
+_lock = threading.Lock()
+_append_lock = threading.Lock()
+
+
+class PartitionSet(collections.namedtuple("PartitionSet", ["directory", "files", "categorical"], defaults=((),))):
+    """Partition files of a partitioned survey, loaded as one table in ``files`` order.
+
+    ``categorical`` names the label columns the set stores as categoricals
+    with sorted labels, decided once for the whole dataset, so the result
+    does not depend on which partitions are in the set.
+    """
+
+
+class _Entry:
+    def __init__(self, path, stat_key, digest, parts=None):
+        self.path = path
+        self.stat_key = stat_key
+        self.digest = digest
+        self.version = digest.hexdigest()
+        self.series = {}
+        self.appended = {}  # column -> parts not yet joined onto its series
+        self.derived = {}
+        self.builders = {}  # derived name -> (build, columns, versioned), for rebuilding on reload
+        self.building = {}  # derived name -> lock held while it is built
+        self._lock = threading.Lock()
+        self.parts = parts  # entries of the partition files, for a PartitionSet
+        # (stat key, size, sha1) of the CSV bytes these rows were parsed from, if known
+        self.source = None
+        if parts is not None:
+            self.table = None
+            self.names = list(parts[0].names)
+        elif path.endswith(ARROW_SUFFIX):
+            from pyarrow import feather
+
+            self.table = feather.read_table(path, memory_map=True)
+            self.names = list(self.table.column_names)
+            metadata = self.table.schema.metadata or {}
+            if SOURCE_STAT in metadata and SOURCE_SHA1 in metadata:
+                source_stat = tuple(map(int, metadata[SOURCE_STAT].split()))
+                self.source = source_stat, source_stat[1], metadata[SOURCE_SHA1].decode("ascii")
+        else:
+            self.table = None
+            frame = _read_csv(path)
+            self.names = list(frame.columns)
+            self.series = {column: frame[column] for column in self.names}
+
+    def base(self, column):
+        """``column`` as loaded from disk, without appended rows."""
+        if column not in self.series:
+            if self.parts is not None:
+                self.series.setdefault(column, _join_parts(self.parts, column, column in self.path.categorical))
+            else:
+                # Columns of a memory-mapped table are wrapped on first use.
+                self.series.setdefault(column, _arrow_series(self.table.column(column)))
+        return self.series[column]
+
+    def dtype(self, column):
+        """dtype of ``column`` including appended rows, without joining them."""
+        with self._lock:
+            parts = [self.base(column), *self.appended.get(column, ())]
+        if len(parts) > 1 and all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            labels = set().union(*(part.cat.categories for part in parts))
+            return pd.CategoricalDtype(sorted(labels))
+        return parts[0].dtype
+
+    def frame(self, columns=None):
+        """Shallow frame over the cached columns; unknown names are skipped."""
+        names = self.names if columns is None else [c for c in columns if c in self.names]
+        if any(column in self.appended for column in names):
+            with self._lock:
+                for column in names:
+                    if column in self.appended:
+                        parts = self.appended.pop(column)
+                        self.series[column] = concat_columns([self.base(column), *parts])
+        return pd.DataFrame({column: self.base(column) for column in names}, copy=False)
+
+    def extended(self, batch, path, stat_key, data):
+        """Copy of this entry with the rows of ``batch`` (``data`` on disk) appended."""
+        entry = copy.copy(self)
+        entry.path = path
+        entry.stat_key = stat_key
+        entry.digest = self.digest.copy()
+        entry.digest.update(data)
+        entry.version = entry.digest.hexdigest()
+        entry._lock = threading.Lock()
+        entry.building = {}
+        with self._lock:
+            entry.series = dict(self.series)
+            entry.appended = {
+                column: self.appended.get(column, []) + [batch[column]]
+                for column in self.names
+            }
+        # Structures that can take a batch are updated; the rest are rebuilt on use.
+        entry.builders = dict(self.builders)
+        entry.derived = {
+            name: value.appended(batch)
+            for name, value in self.derived.items()
+            if hasattr(value, "appended")
+        }
+        return entry
+
+
+def _join_parts(parts, column, categorical=False):
+    """``column`` of every partition entry in ``parts``, concatenated.
+
+    Partitions categorise their columns on their own, small ones rarely;
+    ``categorical`` columns are made categorical (with sorted labels) here.
+    """
+    series = [part.frame([column])[column] for part in parts]
+    joined = series[0] if len(series) == 1 else concat_columns(series)
+    if not isinstance(joined.dtype, pd.CategoricalDtype) and (
+        categorical or any(isinstance(part.dtype, pd.CategoricalDtype) for part in series)
+    ):
+        joined = joined.astype("category")
+    return joined
+
+
+def _arrow_series(chunked):
+    """Series over an Arrow column, sharing its buffers where possible."""
+    import pyarrow as pa
+
+    if chunked.num_chunks == 1 and chunked.null_count == 0:
+        array = chunked.chunk(0)
+        if pa.types.is_dictionary(array.type):
+            codes = array.indices.to_numpy(zero_copy_only=True)
+            categories = array.dictionary.to_pandas()
+            return pd.Series(pd.Categorical.from_codes(codes, categories=categories, validate=False), copy=False)
+        if pa.types.is_integer(array.type) or pa.types.is_floating(array.type):
+            return pd.Series(array.to_numpy(zero_copy_only=True), copy=False)
+    return chunked.to_pandas()
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest
+
+
+def _categorize(frame, max_ratio=CATEGORY_RATIO):
+    """Dictionary-encode the low-cardinality string columns in place.
+
+    Answers such as ``experience`` or ``industry`` repeat a handful of labels,
+    so storing them as categoricals keeps one copy of each label plus small
+    integer codes that groupby/value_counts/isin work on directly. Free-text
+    columns (mostly unique values) are left as strings.
+    """
+    for column in frame.select_dtypes(include="object").columns:
+        if frame[column].nunique() <= max_ratio * len(frame):
+            frame[column] = frame[column].astype("category")
+    return frame
+
+
+def concat_columns(parts):
+    """Concatenate column parts; categoricals get the sorted union of their labels."""
+    if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+        return pd.Series(union_categoricals(parts, sort_categories=True), copy=False)
+    return pd.concat(parts, ignore_index=True)
+
+
+def _read_csv(path):
+    return _categorize(encode(pd.read_csv(path)))
+
+
+def arrow_path(path):
+    """Location of the columnar copy of ``path``."""
+    return os.path.splitext(path)[0] + ARROW_SUFFIX
+
+
+def _copy_source(copy):
+    """Path and stat key of the CSV that ``copy`` was converted from, as recorded in it."""
+    stat_key = _stat_key(copy)
+    cached = _copy_sources.get(copy)
+    if cached is None or cached[0] != stat_key:
+        import pyarrow as pa
+
+        try:
+            with pa.memory_map(copy) as source:
+                metadata = pa.ipc.open_file(source).schema.metadata or {}
+            recorded = metadata[SOURCE_PATH].decode("utf-8"), tuple(map(int, metadata[SOURCE_STAT].split()))
+        except (KeyError, ValueError, pa.ArrowInvalid):
+            recorded = None, None  # written without a source, e.g. by an older version
+        cached = _copy_sources[copy] = (stat_key, recorded)
+    return cached[1]
+
+
+def _is_fresh(copy, source):
+    """Whether ``copy`` was converted from the current version of ``source``."""
+    try:
+        return _copy_source(copy)[1] == _stat_key(source)
+    except FileNotFoundError:
+        return False
+
+
+def _shared_copy(path):
+    """Columnar copy of ``path`` in the shared directory, published if needed."""
+    name = hashlib.sha1(path.encode("utf-8")).hexdigest()[:16]
+    directory = private_directory(SHARED_DIR)
+    target = os.path.join(directory, f"survey-{name}{ARROW_SUFFIX}")
+    if owned(target) and _is_fresh(target, path):
+        return target
+    with file_lock(target + ".lock"):
+        # One worker converts; the others wait and then attach.
+        if not (owned(target) and _is_fresh(target, path)):
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix="survey-", suffix=ARROW_SUFFIX + ".tmp")
+            os.close(fd)
+            try:
+                write_arrow(path, tmp)
+                os.replace(tmp, target)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            clean_shared()
+    # The CSV may have changed while it was converted; then read it directly.
+    return target if owned(target) and _is_fresh(target, path) else path
+
+
+def private_directory(path):
+    """``path``, created with mode 0700 if missing; refused unless only this user can write to it.
+
+    Files in a directory others can write to could be replaced with forged data.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or (USER_ID is not None and info.st_uid != USER_ID) or info.st_mode & 0o022:
+        raise PermissionError(f"{path} must be a directory owned by the current user and writable only by it")
+    return path
+
+
+def owned(path):
+    """Whether ``path`` exists and belongs to the current user."""
+    try:
+        info = os.lstat(path)
+    except FileNotFoundError:
+        return False
+    return stat.S_ISREG(info.st_mode) and (USER_ID is None or info.st_uid == USER_ID)
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on ``path``, created if needed but never truncated or followed as a symlink."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600)
+    try:
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def clean_shared(max_age=None):
+    """Remove shared copies whose CSV is gone or changed, or that no process attached for ``max_age`` seconds."""
+    max_age = SHARED_MAX_AGE if max_age is None else max_age
+    now = time.time()
+    for name in os.listdir(SHARED_DIR):
+        if not name.startswith("survey-") or not name.endswith((ARROW_SUFFIX, ARROW_SUFFIX + ".tmp")):
+            continue
+        location = os.path.join(SHARED_DIR, name)
+        try:
+            stale = now - os.stat(location).st_mtime > max_age
+            if not stale and name.endswith(ARROW_SUFFIX):
+                source, stat_key = _copy_source(location)
+                stale = source is None or not os.path.exists(source) or _stat_key(source) != stat_key
+            if stale:
+                # Processes that mapped the copy keep their mapping.
+                os.remove(location)
+                _copy_sources.pop(location, None)
+                if os.path.exists(location + ".lock"):
+                    os.remove(location + ".lock")
+        except (OSError, ImportError):
+            continue
+
+
+def _resolve(path):
+    """Prefer a columnar copy that is at least as new as the CSV."""
+    path = os.path.abspath(path)
+    if path.endswith(".csv"):
+        entry = _entries.get(path)
+        if entry is not None and entry.stat_key == _stat_key(path):
+            # Loaded from the CSV itself (e.g. after an append): still current.
+            return path
+        columnar = arrow_path(path)
+        if _is_fresh(columnar, path):
+            return columnar
+        if SHARED_DIR and os.path.exists(path):
+            try:
+                return _shared_copy(path)
+            except (ImportError, OSError):
+                pass
+    return path
+
+
+def _partition_entry(key):
+    parts = [_entry(path) for path in key.files]
+    versions = tuple(part.version for part in parts)
+    entry = _entries.get(key)
+    if entry is not None and entry.stat_key == versions:
+        return entry
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry.stat_key == versions:
+            return entry
+        digest = hashlib.sha1()
+        for version in versions:
+            digest.update(version.encode("ascii"))
+        entry = _Entry(key, versions, digest, parts)
+        _entries.pop(key, None)
+        _entries[key] = entry
+        # Each set holds its own joined columns and merged structures; keep the newest few.
+        sets = [other for other in _entries if isinstance(other, PartitionSet)]
+        for other in sets[:max(len(sets) - PARTITION_SETS, 0)]:
+            del _entries[other]
+            _current.pop(other, None)
+        return entry
+
+
+def _key(path):
+    return path if isinstance(path, PartitionSet) else os.path.abspath(path)
+
+
+def _entry(path):
+    entry = _load_entry(path)
+    _current[_key(path)] = entry
+    return entry
+
+
+def _load_entry(path):
+    if isinstance(path, PartitionSet):
+        if not path.files:
+            raise FileNotFoundError(f"No partitions selected in {path.directory}")
+        return _partition_entry(path)
+    grown = _grown_entry(os.path.abspath(path))
+    if grown is not None:
+        return grown
+    path = _resolve(path)
+    stat_key = _stat_key(path)
+    entry = _entries.get(path)
+    if entry is not None and entry.stat_key == stat_key:
+        return entry
+
+    with _lock:
+        entry = _entries.get(path)
+        if entry is not None and entry.stat_key == stat_key:
+            return entry
+        digest = _file_hash(path)
+        if entry is not None and entry.version == digest.hexdigest():
+            # Touched but not edited: keep the parsed columns.
+            entry.stat_key = stat_key
+            if entry.source is not None and not path.endswith(ARROW_SUFFIX):
+                entry.source = (stat_key, *entry.source[1:])
+            return entry
+        if SHARED_DIR and os.path.dirname(path) == os.path.abspath(SHARED_DIR):
+            _touch(path)  # in use: keep it from clean_shared
+            stat_key = _stat_key(path)
+        entry = _Entry(path, stat_key, digest)
+        if not path.endswith(ARROW_SUFFIX) and _stat_key(path) == stat_key:
+            entry.source = stat_key, stat_key[1], entry.version  # unchanged while parsed
+        _entries[path] = entry
+        return entry
+
+
+def _grown_entry(path):
+    """Loaded entry of the CSV ``path`` extended by the rows appended since, or None.
+
+    Applies when the file only grew: its first bytes still hash to what
+    was parsed and the new bytes are complete lines that start on a line
+    of their own. Only those lines are
+    parsed, and derived structures are updated from them like after
+    ``append_rows``. Anything else is a rewrite and is re-read in full.
+    """
+    entry = _current.get(path)
+    if entry is None or entry.source is None or not path.endswith(".csv"):
+        return None
+    known_stat, size, sha1 = entry.source
+    try:
+        stat_key = _stat_key(path)
+    except FileNotFoundError:
+        return None
+    if stat_key == known_stat or stat_key[1] <= size:
+        return None
+
+    with _lock:
+        current = _entries.get(path)
+        if current is not None and current.stat_key == stat_key:
+            return current  # another thread got here first
+        digest = hashlib.sha1()
+        last = b"\n"
+        with open(path, "rb") as fh:
+            remaining = size
+            while remaining:
+                chunk = fh.read(min(1 << 20, remaining))
+                if not chunk:
+                    return None
+                digest.update(chunk)
+                last = chunk[-1:]
+                remaining -= len(chunk)
+            if digest.hexdigest() != sha1:
+                return None
+            data = fh.read(stat_key[1] - size)
+        if not data.endswith(b"\n"):
+            return None  # a row still being written
+        if last != b"\n" and not data.startswith(b"\n"):
+            return None  # the first new row continues the last old line
+        from ingest import validate_batch
+
+        try:
+            header = list(pd.read_csv(path, nrows=0).columns)
+            batch = pd.read_csv(io.BytesIO(data), header=None, names=header)
+            batch = validate_batch(encode(batch), {column: entry.dtype(column) for column in entry.names})
+        except ValueError:
+            return None
+        if batch.empty:
+            return None
+        with stage("load/append"):
+            extended = entry.extended(batch, path, stat_key, data)
+        digest.update(data)
+        extended.source = stat_key, stat_key[1], digest.hexdigest()
+        _entries.pop(entry.path, None)
+        _entries[path] = extended
+        return extended
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+@profiled("load")
+def load_survey(path=DEFAULT_DATASET, columns=None):
+    """Return the survey table, parsing the file only when it has changed.
+
+    ``columns`` limits the frame to the columns a page needs; with a columnar
+    copy on disk the other columns are never read.
+    """
+    return _entry(path).frame(columns)
+
+
+def data_version(path=DEFAULT_DATASET):
+    """Content hash of the currently loaded version of ``path``."""
+    return _entry(path).version
+
+
+def schema(path=DEFAULT_DATASET):
+    """Column name -> dtype of the loaded survey."""
+    entry = _entry(path)
+    return {column: entry.dtype(column) for column in entry.names}
+
+
+def append_rows(batch, path=DEFAULT_DATASET, raw=None):
+    """Append ``batch`` to the CSV at ``path`` and to the loaded survey.
+
+    ``batch`` must have the survey's columns and dtypes (``ingest.py``
+    checks this). ``raw`` holds the same rows as given, before ``encode``;
+    it is what the CSV receives (the columns in its header), so the file
+    keeps only raw answers. Without it ``batch`` is written as is. Only
+    the batch is parsed, hashed and aggregated: derived structures with an
+    ``appended(batch)`` method are updated from it and the data version
+    moves on, so cached results for the old rows are no longer used.
+    """
+    if isinstance(path, PartitionSet):
+        raise ValueError("Append to a partition file, or add a wave with partitions.py")
+    source = os.path.abspath(path)
+    with _append_lock:
+        entry = _entry(source)
+        header = list(pd.read_csv(source, nrows=0).columns)
+        written = batch if raw is None else raw
+        data = written.to_csv(index=False, header=False, columns=header, lineterminator="\n").encode("utf-8")
+        with open(source, "rb+") as fh:
+            size = fh.seek(0, os.SEEK_END)
+            if size:
+                fh.seek(size - 1)
+                if fh.read(1) != b"\n":
+                    data = b"\n" + data
+            fh.write(data)
+        # Any columnar copy is now stale; the extended entry answers for the CSV.
+        extended = entry.extended(batch, source, _stat_key(source), data)
+        # The file was not hashed, so a later append by another process is read in full.
+        extended.source = None
+        with _lock:
+            _entries.pop(entry.path, None)
+            _entries[source] = extended
+    return len(batch)
+
+
+def clear_cache():
+    """Forget every loaded dataset so the next load reads from disk."""
+    with _lock:
+        _entries.clear()
+        _current.clear()
+
+
+def refresh(path=DEFAULT_DATASET):
+    """Load the current version of ``path`` now and rebuild what was derived from it.
+
+    Meant for a file watcher: a changed file is parsed once, the derived
+    structures its previous version had are rebuilt for the new one, and
+    loaded partition sets containing it are refreshed the same way. Returns
+    the versions that were replaced, so their cached results can be dropped.
+    """
+    key = _key(path)
+    keys = [key, *(other for other in list(_entries) if isinstance(other, PartitionSet) and key in other.files)]
+    replaced = []
+    for key in keys:
+        old = _current.get(key)
+        if old is None:
+            continue  # not loaded in this process
+        try:
+            new = _entry(key)
+        except FileNotFoundError:
+            continue  # removed; the next load reports it
+        if new is old:
+            continue
+        for name, (build, columns, versioned) in list(old.builders.items()):
+            derived(name, build, key, columns, versioned)
+        replaced.append(old.version)
+    return replaced
+
+
+def derived(name, build, path=DEFAULT_DATASET, columns=None, versioned=False):
+    """Return ``build(frame)`` for the current version of ``path``.
+
+    Structures derived from the survey (indexes, aggregates) are built once
+    per data version from ``columns`` and dropped together with the data
+    they came from. ``versioned`` builds are called as ``build(frame,
+    version)``, e.g. to name files shared between processes. A build only
+    holds up callers waiting for the same structure of the same version.
+    """
+    entry = _entry(path)
+    try:
+        return entry.derived[name]
+    except KeyError:
+        pass
+    with entry._lock:
+        lock = entry.building.setdefault(name, threading.Lock())
+    with lock:
+        if name not in entry.derived:
+            with stage(f"build/{name}"):
+                frame = entry.frame(columns)
+                entry.derived[name] = build(frame, entry.version) if versioned else build(frame)
+            entry.builders[name] = (build, columns, versioned)
+        return entry.derived[name]
+
+
+def merged_parts(name, load, merge, path):
+    """``load(file)`` of every partition of the ``PartitionSet`` ``path``, combined with ``merge``.
+
+    Each partition builds its own structure once, however many selections
+    it is part of; a set only merges them, once per version.
+    """
+    return derived(name, lambda frame: functools.reduce(merge, map(load, path.files)), path, columns=[])
+
+
+def write_arrow(csv_path, out_path=None):
+    """Convert ``csv_path`` to an uncompressed, dictionary-encoded Arrow file."""
+    import pyarrow as pa
+    from pyarrow import feather
+
+    out_path = out_path or arrow_path(csv_path)
+    stat_key = _stat_key(csv_path)  # before reading: a later change makes the copy stale
+    digest = _file_hash(csv_path)
+    table = pa.Table.from_pandas(_read_csv(csv_path), preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        SOURCE_PATH: os.path.abspath(csv_path).encode("utf-8"),
+        SOURCE_STAT: " ".join(map(str, stat_key)).encode("ascii"),
+        SOURCE_SHA1: digest.hexdigest().encode("ascii"),
+    })
+    # Uncompressed and in a single record batch so readers can memory-map
+    # every column as one contiguous buffer.
+    feather.write_feather(table, out_path, compression="uncompressed", chunksize=max(table.num_rows, 1))
+    return out_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert survey CSV files to Arrow IPC.")
+    parser.add_argument("csv", nargs="+", help="CSV files to convert")
+    args = parser.parse_args()
+    for csv_path in args.csv:
+        print(f"{csv_path} -> {write_arrow(csv_path)}")
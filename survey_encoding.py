@@ -0,0 +1,66 @@
+"""Declarative encoding of the raw survey answers.
+
+``newbies.csv`` holds the answers as given. The dashboards also use
+shortened industry labels and numeric scores for three of the answers;
+``LABEL_MAPS`` and ``NUMERIC_CODES`` declare both, and ``encode`` derives
+them when the survey is loaded. Each source column is reduced to its
+category codes once and the new values are looked up per category, so the
+work per row is a single array index rather than a Python call.
+"""
+import numpy as np
+
+
+# column -> {raw label: dashboard label}; other labels are kept
+LABEL_MAPS = {
+    "industry": {
+        "Finance/banking": "Finance",
+        "Retail/E-commerce": "Retail",
+    },
+}
+
+# numeric column -> (label column, {label: score})
+NUMERIC_CODES = {
+    "motivation_numeric": ("motivation", {
+        "Good salary potential": 1,
+        "High demand for data roles": 2,
+        "Interested in working with data": 3,
+        "Opportunities for growth": 4,
+    }),
+    "satisfaction_numeric": ("satisfaction", {
+        "1-3(Not satisfied)": 1,
+        "4-5(somewhat satisfied)": 5,
+        "7-8(satisfied)": 8,
+        "9-10(very satisfied)": 10,
+    }),
+    "job_ease_numeric": ("job_ease", {
+        "Very difficult": 1,
+        "Difficult": 2,
+        "Somewhat easy": 3,
+        "Very easy": 4,
+    }),
+}
+
+
+def _lookup(series, mapping, dtype):
+    """``mapping`` applied once per category of ``series``, then spread to the rows."""
+    categorical = series.astype("category")
+    # Missing answers have code -1, which picks the trailing NaN.
+    table = np.array([mapping(label) for label in categorical.cat.categories] + [np.nan], dtype=dtype)
+    return table[categorical.cat.codes.to_numpy()]
+
+
+def encode(frame):
+    """``frame`` with normalised labels and the ``*_numeric`` columns derived.
+
+    Numeric columns are integers when every label has a score and floats
+    with NaN otherwise. Encoding an already encoded frame changes nothing.
+    """
+    frame = frame.copy()
+    for column, renames in LABEL_MAPS.items():
+        if column in frame.columns:
+            frame[column] = _lookup(frame[column], lambda label: renames.get(label, label), object)
+    for column, (source, scores) in NUMERIC_CODES.items():
+        if source in frame.columns:
+            values = _lookup(frame[source], lambda label: scores.get(label, np.nan), float)
+            frame[column] = values if np.isnan(values).any() else values.astype(np.int64)
+    return frame
@@ -0,0 +1,133 @@
+"""Server-side pages of the filtered survey for the "View Data" section.
+
+Only one page of a ``FilteredView`` is ever sent to the browser. Sorting
+uses a per-column row order computed once per data version; a filtered view
+is put in that order once per selection and sort (kept in a small LRU), and
+every page after that is a slice of those positions. Only the projected
+columns of the page's rows are copied, and styling such as the numeric
+gradient is computed for that page alone, with colour ranges taken from the
+whole column so colours do not shift between pages.
+"""
+import copy
+import os
+
+import numpy as np
+import pandas as pd
+
+from filter_index import FilteredView
+from result_cache import ResultCache, cached
+from survey_data import DEFAULT_DATASET, derived
+
+
+PAGE_SIZES = (25, 50, 100, 500)
+GRADIENT = ("#f7fbff", "#08519c")  # light to dark blue
+
+orders = ResultCache(int(os.environ.get("DASHBOARD_SORT_CACHE_SIZE", 8)))
+
+
+class SortOrder:
+    """Stable row orders of one column, missing values last in both directions."""
+
+    def __init__(self, frame):
+        codes, uniques = pd.factorize(frame.iloc[:, 0], sort=True)
+        missing = codes < 0
+        self.ascending = np.argsort(np.where(missing, len(uniques), codes), kind="stable")
+        self.descending = np.argsort(np.where(missing, len(uniques), len(uniques) - 1 - codes), kind="stable")
+
+
+class ColumnRanges:
+    """Minimum and maximum of every numeric column, for page styling."""
+
+    def __init__(self, frame):
+        numeric = frame.select_dtypes(include="number")
+        self.ranges = {column: (numeric[column].min(), numeric[column].max()) for column in numeric.columns}
+
+    def appended(self, batch):
+        ranges = copy.copy(self)
+        ranges.ranges = {
+            column: (min(low, batch[column].min()), max(high, batch[column].max()))
+            for column, (low, high) in self.ranges.items()
+        }
+        return ranges
+
+
+def load_sort_order(column, path=DEFAULT_DATASET):
+    """Sort orders of ``column`` for the current version of ``path``."""
+    return derived(f"sort_order/{column}", SortOrder, path, columns=[column])
+
+
+def load_column_ranges(path=DEFAULT_DATASET):
+    """Numeric column ranges for the current version of ``path``."""
+    return derived("column_ranges", ColumnRanges, path)
+
+
+def sorted_view(view, column, ascending=True, selections=None, path=DEFAULT_DATASET):
+    """``view`` with its rows in order of ``column``."""
+    def build():
+        order = getattr(load_sort_order(column, path), "ascending" if ascending else "descending")
+        if view.rows is None:
+            return order
+        keep = np.zeros(len(view.base), dtype=bool)
+        keep[view.rows] = True
+        return order[keep[order]].astype(view.rows.dtype)
+    rows = cached(f"sort/{column}/{ascending}", selections, build, path, cache=orders)
+    return FilteredView(view.base, rows)
+
+
+def page(view, number, page_size, columns=None):
+    """Rows of page ``number`` (from 0) of ``view``, projected to ``columns``."""
+    start = number * page_size
+    return view.frame(columns, start=start, stop=start + page_size)
+
+
+def _gradient(values, low, high):
+    span = (high - low) or 1
+    start, end = (np.array([int(color[i:i + 2], 16) for i in (1, 3, 5)]) for color in GRADIENT)
+    styles = []
+    for value in values:
+        if pd.isna(value):
+            styles.append("")
+            continue
+        share = min(max((value - low) / span, 0), 1)
+        red, green, blue = (start + (end - start) * share).round().astype(int)
+        text = "white" if share > 0.5 else "black"
+        styles.append(f"background-color: #{red:02x}{green:02x}{blue:02x}; color: {text}")
+    return styles
+
+
+def style_page(frame, ranges):
+    """Styler colouring the numeric columns of one page by their full-column range."""
+    styler = frame.style
+    for column in frame.columns:
+        if column in ranges:
+            low, high = ranges[column]
+            styler = styler.apply(_gradient, subset=[column], low=low, high=high)
+    return styler
+
+
+def show_table(view, selections=None, path=DEFAULT_DATASET):
+    """Paginated, sortable table of ``view`` with column and page-size controls."""
+    import streamlit as st
+
+    names = list(view.columns)
+    columns = st.multiselect("Columns", names, default=names, key="table_columns") or names
+    left, middle, right = st.columns(3)
+    sort = left.selectbox("Sort by", ["(row order)", *names], key="table_sort")
+    descending = middle.toggle("Descending", value=False, key="table_descending")
+    page_size = right.selectbox("Rows per page", PAGE_SIZES, index=1, key="table_page_size")
+
+    if sort != "(row order)":
+        view = sorted_view(view, sort, not descending, selections, path)
+    pages = max(-(-len(view) // page_size), 1)
+    if st.session_state.get("table_page", 1) > pages:
+        st.session_state["table_page"] = pages  # the filters left fewer pages
+    number = st.number_input("Page", min_value=1, max_value=pages, step=1, key="table_page")
+    rows = page(view, number - 1, page_size, columns)
+
+    # An empty page has nothing to colour, and streamlit cannot serialise an
+    # empty styled frame with categorical columns under NumPy 2.
+    if st.toggle("Colour numeric columns", value=False, key="table_gradient") and len(rows):
+        rows = style_page(rows, load_column_ranges(path).ranges)
+    st.dataframe(rows, use_container_width=True)
+    first = (number - 1) * page_size
+    st.caption(f"Rows {min(first + 1, len(view))}-{min(first + page_size, len(view))} of {len(view)}")
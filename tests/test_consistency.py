@@ -0,0 +1,147 @@
+"""The query backends, incremental updates and partition sets agree with a plain rebuild.
+
+Run from the repository root with ``python -m pytest tests``.
+"""
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import charts
+import generate_survey
+import partitions
+import query_engine
+import sql_backend
+import survey_data
+from aggregate_cube import CountCube
+from filter_index import FILTER_COLUMNS, FilterIndex
+from query_engine import DashboardSpec
+from text_index import SEARCH
+
+
+ROWS = 3000
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), survey_data.DEFAULT_DATASET)
+SEARCHES = ["data", "job", '"data analysis"', "skills communication", "zzzz"]
+
+# Every chart grouping plus groupings and metrics that need the rows
+SPEC = DashboardSpec(
+    "test",
+    {**charts.CHART_DIMENSIONS, "numeric": ["motivation_numeric", "experience"], "challenge": ["challenge"]},
+    {**charts.KPI_METRICS, "rows": ("count", None), "challenges": ("nunique", "challenge")},
+)
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    """A synthetic survey CSV, loaded without shared copies and with a private SQLite directory."""
+    directory = tmp_path_factory.mktemp("survey")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(survey_data, "SHARED_DIR", "")
+        patch.setattr(sql_backend, "SQLITE_DIR", str(directory / "sqlite"))
+        yield generate_survey.write_survey(ROWS, str(directory / "survey.csv"), SOURCE, seed=1)
+    survey_data.clear_cache()
+
+
+def _selections(filter_index, count, seed=0):
+    rng = random.Random(seed)
+    found = [{}, {"industry": ["no such industry"]}]
+    for _ in range(count):
+        selections = {}
+        for column in FILTER_COLUMNS:
+            options = filter_index.options(column)
+            if rng.random() < 0.5:
+                selections[column] = rng.sample(options, rng.randint(1, len(options)))
+        if rng.random() < 0.3:
+            selections[SEARCH] = [rng.choice(SEARCHES)]
+        found.append(selections)
+    return found
+
+
+def _assert_same(left, right, context, exact=True):
+    """Equal results; without ``exact``, categoricals may differ in labels no row has."""
+    assert left.keys() == right.keys(), context
+    for key, value in left.items():
+        if isinstance(value, pd.DataFrame):
+            expected = right[key]
+            if not exact:
+                value, expected = value.astype(object), expected.astype(object)
+            pd.testing.assert_frame_equal(value, expected, obj=f"{key} for {context}")
+        else:
+            assert value == right[key], f"{key} for {context}"
+
+
+def test_sqlite_matches_pandas(dataset):
+    filter_index = query_engine.load_filter_index(dataset)
+    for selections in _selections(filter_index, 25):
+        for spec in (SPEC, charts.DASHBOARD_SPEC):
+            _assert_same(
+                query_engine.compute(spec, selections, dataset, backend="pandas"),
+                query_engine.compute(spec, selections, dataset, backend="sqlite"),
+                selections,
+            )
+
+
+def test_missing_selection_means_no_filters(dataset):
+    for backend in query_engine.BACKENDS:
+        _assert_same(
+            query_engine.compute(SPEC, None, dataset, backend=backend),
+            query_engine.compute(SPEC, {}, dataset, backend=backend),
+            backend,
+        )
+
+
+def test_appended_indexes_match_rebuilt(dataset):
+    frame = survey_data.load_survey(dataset)
+    cuts = [0, 1000, 1001, 1737, 2500, len(frame)]
+    index = FilterIndex(frame.iloc[:cuts[1]])
+    cube = CountCube(frame.iloc[:cuts[1]])
+    for start, stop in zip(cuts[1:], cuts[2:]):
+        batch = frame.iloc[start:stop].reset_index(drop=True)
+        index, cube = index.appended(batch), cube.appended(batch)
+    rebuilt = FilterIndex(frame)
+
+    assert index.size == rebuilt.size
+    for selections in _selections(rebuilt, 25, seed=1):
+        expected = rebuilt.mask(selections)
+        actual = index.mask(selections)
+        if expected is None:
+            assert actual is None
+        else:
+            assert np.array_equal(actual, expected), selections
+    for column in rebuilt.text.columns:
+        pd.testing.assert_frame_equal(index.text.top_terms(column), rebuilt.text.top_terms(column))
+
+    dimensions = cube.dimensions
+    expected = CountCube(frame).counts.astype({column: object for column in dimensions})
+    actual = cube.counts.astype({column: object for column in dimensions})
+    pd.testing.assert_frame_equal(
+        actual.sort_values(dimensions).reset_index(drop=True),
+        expected.sort_values(dimensions).reset_index(drop=True),
+    )
+
+
+def test_pruned_partitions_match_one_file(dataset, tmp_path):
+    raw = pd.read_csv(dataset)
+    directory = str(tmp_path / "waves")
+    partitions.write_wave(raw.iloc[:1800], directory, "2024-06")
+    partitions.write_wave(raw.iloc[1800:2980], directory, "2025-01")
+    # Partitions of a few rows keep their labels uncategorised on their own
+    partitions.write_wave(raw.iloc[2980:], directory, "2025-06")
+    survey = partitions.select(directory)
+    # The same rows in the same order as one plain CSV
+    single = str(tmp_path / "all.csv")
+    pd.concat([pd.read_csv(path) for path in survey.files], ignore_index=True).to_csv(single, index=False)
+
+    filter_index = query_engine.load_filter_index(single)
+    for selections in _selections(filter_index, 25, seed=2):
+        pruned = partitions.prune(survey, selections)
+        assert len(pruned.files) <= len(survey.files)
+        for spec in (SPEC, charts.DASHBOARD_SPEC):
+            _assert_same(
+                query_engine.compute(spec, selections, pruned, backend="pandas"),
+                query_engine.compute(spec, selections, single, backend="pandas"),
+                selections,
+                exact=False,  # pruned partitions may lack labels the selection filters out anyway
+            )
@@ -0,0 +1,253 @@
+"""Inverted index over the free-text survey answers.
+
+Every answer in ``TEXT_COLUMNS`` is lowercased and split into word tokens.
+Each distinct answer is tokenised once, however many respondents gave it,
+and the index keeps, per term, the sorted positions of the rows whose
+answers contain it. A search intersects those posting lists instead of
+scanning the text, so its cost follows the number of matching rows rather
+than the size of the survey.
+
+A query is a list of words and ``"quoted phrases"``, all of which must
+match. A phrase's candidate rows come from intersecting the postings of its
+words; only their distinct answers are then checked for the words in order.
+
+The index is kept by ``FilterIndex`` and answers the ``SEARCH`` entry of a
+sidebar selection, so keyword filters combine with the multiselects, reach
+every chart and are part of the result cache key. Appended responses only
+add postings for the rows of the batch.
+"""
+import copy
+import re
+
+import numpy as np
+import pandas as pd
+
+
+TEXT_COLUMNS = ("challenge", "valuable_skill", "balance_skills")
+SEARCH = "search"  # selection key holding the keyword queries
+
+TOKEN = re.compile(r"[a-z0-9]+")
+QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+
+# Left out of the top-terms chart, but still searchable.
+STOPWORDS = frozenset("""
+    a about an and are as at be but by can do for from has have how i if in
+    into is it its me more my no not of on or so some that the their them
+    there they this to too very was we what when which with without you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens of ``text``."""
+    return TOKEN.findall(str(text).lower())
+
+
+def parse_query(query):
+    """Token lists of the words and ``"quoted phrases"`` in ``query``."""
+    parts = []
+    for phrase, word in QUERY_PART.findall(query):
+        tokens = tokenize(phrase or word)
+        if tokens:
+            parts.append(tokens)
+    return parts
+
+
+class TextIndex:
+    def __init__(self, frame, columns=TEXT_COLUMNS):
+        self.size = 0
+        self.columns = [column for column in columns if column in frame.columns]
+        self.terms = {}  # term -> term id
+        self.postings = {}  # term id -> sorted row positions
+        self.values = {column: {} for column in self.columns}  # answer -> value id
+        self.codes = {column: np.empty(0, dtype=np.int32) for column in self.columns}  # row -> value id, -1 if missing
+        # Per value id, as flat arrays with offsets: its terms in order, and its distinct terms.
+        self.tokens = {column: _Ragged() for column in self.columns}
+        self.distinct = {column: _Ragged() for column in self.columns}
+        self._add(frame)
+
+    def _add(self, frame):
+        """Index the rows of ``frame`` as the rows after the current ones."""
+        start = self.size
+        rows, terms = [], []
+        for column in self.columns:
+            local, answers = pd.factorize(frame[column])
+            known = self.values[column]
+            first_new = len(known)
+            ids = np.empty(len(answers), dtype=np.int32)
+            new_tokens, lengths = [], []
+            for position, answer in enumerate(answers):
+                value = known.get(answer)
+                if value is None:
+                    value = known[answer] = len(known)
+                    tokens = [self.terms.setdefault(term, len(self.terms)) for term in tokenize(answer)]
+                    new_tokens += tokens
+                    lengths.append(len(tokens))
+                ids[position] = value
+            codes = np.append(ids, -1)[local]
+            self.codes[column] = np.concatenate([self.codes[column], codes])
+
+            flat = np.array(new_tokens, dtype=np.int32)
+            self.tokens[column] = self.tokens[column].extended(flat, lengths)
+            # Distinct terms per new value: unique (value, term) keys, ordered by value.
+            owners = np.repeat(np.arange(first_new, len(known), dtype=np.int64), lengths)
+            width = max(len(self.terms), 1)
+            owners, distinct = np.divmod(np.unique(owners * width + flat), width)
+            counts = np.bincount(owners - first_new, minlength=len(lengths))
+            self.distinct[column] = self.distinct[column].extended(distinct.astype(np.int32), counts)
+
+            # One (row, term) pair per distinct term of every answered row.
+            present = np.flatnonzero(codes >= 0)
+            rows.append(np.repeat(present + start, self.distinct[column].lengths(codes[present])))
+            terms.append(self.distinct[column].gather(codes[present]))
+
+        self.size = start + len(frame)
+        if not sum(map(len, rows)):
+            return
+        rows, terms = np.concatenate(rows), np.concatenate(terms)
+        order = np.lexsort((rows, terms))
+        rows, terms = rows[order].astype(np.int32 if self.size < 2**31 else np.int64), terms[order]
+        # A row may hold a term in several columns; keep it once per term.
+        keep = np.ones(len(rows), dtype=bool)
+        keep[1:] = (terms[1:] != terms[:-1]) | (rows[1:] != rows[:-1])
+        rows, terms = rows[keep], terms[keep]
+        bounds = np.flatnonzero(np.diff(terms)) + 1
+        for term, postings in zip(terms[np.concatenate([[0], bounds])], np.split(rows, bounds)):
+            old = self.postings.get(term)
+            # New rows come after every indexed row, so the list stays sorted.
+            self.postings[term] = postings if old is None else np.concatenate([old, postings])
+
+    def appended(self, batch):
+        """Index over the existing rows followed by the rows of ``batch``."""
+        index = copy.copy(self)
+        index.terms = dict(self.terms)
+        index.postings = dict(self.postings)
+        index.values = {column: dict(values) for column, values in self.values.items()}
+        index.codes, index.tokens, index.distinct = dict(self.codes), dict(self.tokens), dict(self.distinct)
+        index._add(batch)
+        return index
+
+    def merged(self, other):
+        """Index over the rows of this index followed by the rows of ``other``.
+
+        Terms and answers of ``other`` are mapped onto this index's ids and
+        its postings are shifted past this index's rows; no text is
+        tokenised again.
+        """
+        index = copy.copy(self)
+        index.size = self.size + other.size
+        index.terms = dict(self.terms)
+        terms = np.array([index.terms.setdefault(term, len(index.terms)) for term in other.terms], dtype=np.int32)
+        index.postings = dict(self.postings)
+        dtype = np.int32 if index.size < 2**31 else np.int64
+        for term, rows in other.postings.items():
+            term = int(terms[term])
+            rows = (rows + self.size).astype(dtype)
+            old = index.postings.get(term)
+            index.postings[term] = rows if old is None else np.concatenate([old, rows])
+
+        index.values, index.codes, index.tokens, index.distinct = {}, {}, {}, {}
+        for column in self.columns:
+            values = index.values[column] = dict(self.values[column])
+            ids = np.array([values.setdefault(answer, len(values)) for answer in other.values[column]], dtype=np.int32)
+            index.codes[column] = np.concatenate([self.codes[column], np.append(ids, -1)[other.codes[column]]])
+            # Answers new to this index get ids in order, after the known ones.
+            new = np.flatnonzero(ids >= len(self.values[column]))
+            for name in ("tokens", "distinct"):
+                ragged = getattr(other, name)[column]
+                extended = getattr(self, name)[column].extended(terms[ragged.gather(new)], ragged.lengths(new))
+                getattr(index, name)[column] = extended
+        return index
+
+    def _phrase_rows(self, tokens):
+        ids = [self.terms.get(token) for token in tokens]
+        if None in ids:
+            return np.empty(0, dtype=np.int32)
+        postings = sorted((self.postings[term] for term in set(ids)), key=len)
+        rows = postings[0]
+        for other in postings[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        if len(ids) == 1 or not len(rows):
+            return rows
+
+        phrase = np.array(ids, dtype=np.int32)
+        keep = np.zeros(len(rows), dtype=bool)
+        for column in self.columns:
+            values = self.codes[column][rows]
+            candidates = np.unique(values[values >= 0])
+            matching = candidates[self.tokens[column].contains(candidates, phrase)]
+            keep |= np.isin(values, matching)
+        return rows[keep]
+
+    def search(self, query):
+        """Sorted positions of the rows matching every part of ``query``, or None for an empty query."""
+        parts = parse_query(query)
+        if not parts:
+            return None
+        matches = sorted((self._phrase_rows(tokens) for tokens in parts), key=len)
+        rows = matches[0]
+        for other in matches[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def mask(self, queries):
+        """Boolean row mask for rows matching every query, or None if all are empty."""
+        mask = None
+        for query in queries:
+            rows = self.search(query)
+            if rows is None:
+                continue
+            matched = np.zeros(self.size, dtype=bool)
+            matched[rows] = True
+            mask = matched if mask is None else mask & matched
+        return mask
+
+    def top_terms(self, column, rows=None, limit=20):
+        """Most frequent terms of ``column`` among ``rows`` (all rows if None).
+
+        A term counts once per response that used it; stopwords are left out.
+        """
+        codes = self.codes[column] if rows is None else self.codes[column][rows]
+        distinct = self.distinct[column]
+        answers = np.bincount(codes[codes >= 0], minlength=len(self.values[column]))
+        counts = np.bincount(distinct.flat, weights=np.repeat(answers, distinct.lengths()), minlength=len(self.terms))
+        names = np.array(list(self.terms), dtype=object)
+        keep = (counts > 0) & ~np.isin(names, list(STOPWORDS))
+        top = pd.DataFrame({"term": names[keep], "count": counts[keep].astype(np.int64)})
+        return top.sort_values(["count", "term"], ascending=[False, True]).head(limit).reset_index(drop=True)
+
+
+class _Ragged:
+    """Variable-length int arrays, one per id, stored flat with offsets."""
+
+    def __init__(self, flat=None, offsets=None):
+        self.flat = np.empty(0, dtype=np.int32) if flat is None else flat
+        self.offsets = np.zeros(1, dtype=np.int64) if offsets is None else offsets
+
+    def extended(self, flat, lengths):
+        """Copy with arrays of ``lengths`` taken from ``flat`` appended."""
+        offsets = self.offsets[-1] + np.cumsum(lengths, dtype=np.int64)
+        return _Ragged(np.concatenate([self.flat, flat]), np.concatenate([self.offsets, offsets]))
+
+    def lengths(self, ids=None):
+        lengths = np.diff(self.offsets)
+        return lengths if ids is None else lengths[ids]
+
+    def gather(self, ids):
+        """The arrays of ``ids``, concatenated."""
+        starts, lengths = self.offsets[ids], self.lengths(ids)
+        first = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return self.flat[first + np.arange(lengths.sum())]
+
+    def contains(self, ids, phrase):
+        """Whether each array of ``ids`` holds ``phrase`` as consecutive values."""
+        lengths = self.lengths(ids)
+        flat = self.gather(ids)
+        owners = np.repeat(np.arange(len(ids)), lengths)
+        windows = max(len(flat) - len(phrase) + 1, 0)
+        # A window matches if it lies within one array and equals the phrase.
+        hits = owners[:windows] == owners[len(phrase) - 1:len(phrase) - 1 + windows]
+        for offset, term in enumerate(phrase):
+            hits &= flat[offset:offset + windows] == term
+        found = np.zeros(len(ids), dtype=bool)
+        found[owners[:windows][hits]] = True
+        return found